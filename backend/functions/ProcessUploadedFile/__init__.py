@@ -8,9 +8,7 @@ import azure.functions as func
 # Importa o gestor principal a partir do pacote 'shared'.
 # Esta é a correção principal, que trata 'shared' como um pacote.
 from shared.main_handler import process_event
-
-from azure.storage.blob import BlobServiceClient
-from azure.data.tables import TableServiceClient
+from shared.services.clients import get_blob_service_client, get_table_client
 
 def main(myblob: func.InputStream):
     """
@@ -21,9 +19,10 @@ def main(myblob: func.InputStream):
         # Pega a connection string das configurações do ambiente
         connection_string = os.environ["AzureWebJobsStorage"]
         
-        # Inicializa os clientes de serviço que serão passados para a lógica principal
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        table_client = TableServiceClient.from_connection_string(connection_string).get_table_client("jobs")
+        # Clientes partilhados pelo processo: só a primeira invocação os cria,
+        # as seguintes reutilizam as mesmas ligações HTTP.
+        blob_service_client = get_blob_service_client(connection_string)
+        table_client = get_table_client("jobs", connection_string)
         
         # Chama a função de lógica de negócio, passando todos os parâmetros necessários
         process_event(
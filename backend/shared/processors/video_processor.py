@@ -1,40 +1,119 @@
 import cv2
 import os
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from .image_processor import generate_thumbnail
 
 logger = logging.getLogger(__name__)
 
-def extract_keyframes(input_path, output_dir, interval=5):
+# FPS assumido quando o ficheiro não traz essa informação (CAP_PROP_FPS = 0).
+FALLBACK_FPS = 25.0
+# Com intervalos a partir deste valor (mais longos que um GOP típico de 2 s) compensa
+# saltar (seek) para cada frame em vez de avançar frame a frame.
+SEEK_MIN_INTERVAL = 4
+# Modo de mudança de cena: frames analisados por segundo, tamanho reduzido para o
+# histograma, e intervalo mínimo entre dois keyframes.
+SCENE_SAMPLES_PER_SECOND = 5
+SCENE_ANALYSIS_SIZE = (64, 36)
+SCENE_MIN_GAP_SECONDS = 1.0
+# JPEGs à espera de serem escritos; limita a memória se a codificação atrasar.
+MAX_PENDING_WRITES = 16
+
+def _video_fps(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if not fps or fps != fps or fps <= 0:  # 0, NaN ou negativo
+        logger.warning(f"FPS metadata missing; assuming {FALLBACK_FPS}")
+        return FALLBACK_FPS
+    return fps
+
+def _scene_histogram(frame):
+    """Histograma H-S normalizado de uma versão muito reduzida do frame."""
+    small = cv2.resize(frame, SCENE_ANALYSIS_SIZE, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist).flatten()
+
+def _sampled_frames(cap, fps, interval):
+    """Um frame a cada 'interval' segundos: avança com grab() e só faz retrieve() dos escolhidos."""
+    frame_interval = max(1, int(round(fps * interval)))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if interval >= SEEK_MIN_INTERVAL and frame_count > 0:
+        # Intervalos longos: salta diretamente para cada frame (o decoder parte do keyframe anterior).
+        for index in range(0, frame_count, frame_interval):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+        return
+
+    index = 0
+    while cap.grab():
+        if index % frame_interval == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield frame
+        index += 1
+
+def _scene_frames(cap, fps, threshold):
+    """Frames onde a cena muda: distância de Bhattacharyya entre histogramas acima de 'threshold'."""
+    step = max(1, int(round(fps / SCENE_SAMPLES_PER_SECOND)))
+    min_gap = int(fps * SCENE_MIN_GAP_SECONDS)
+    previous, last_selected, index = None, None, 0
+    while cap.grab():
+        if index % step == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            hist = _scene_histogram(frame)
+            changed = previous is None or cv2.compareHist(previous, hist, cv2.HISTCMP_BHATTACHARYYA) > threshold
+            if changed and (last_selected is None or index - last_selected >= min_gap):
+                last_selected = index
+                yield frame
+            previous = hist
+        index += 1
+
+def extract_keyframes(input_path, output_dir, interval=5, mode='interval', scene_threshold=0.4, workers=4):
+    """
+    Extrai keyframes numa só passagem pelo vídeo.
+    mode='interval': um frame a cada 'interval' segundos;
+    mode='scene': um frame por mudança de cena (histogramas de frames reduzidos).
+    Os JPEGs são codificados num pool de threads enquanto a descodificação continua.
+    """
     try:
         # Garantir que o diretório de saída existe
         os.makedirs(output_dir, exist_ok=True)
         
         # Abrir o vídeo
         cap = cv2.VideoCapture(input_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_interval = int(fps * interval)
-        count = 0
-        frame_count = 0
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {input_path}")
+        fps = _video_fps(cap)
+
+        if mode == 'interval':
+            frames = _sampled_frames(cap, fps, interval)
+        elif mode == 'scene':
+            frames = _scene_frames(cap, fps, scene_threshold)
+        else:
+            raise ValueError(f"Unknown keyframe mode: {mode}")
+
         keyframes = []
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            # Salvar frame a cada intervalo especificado
-            if count % frame_interval == 0:
-                frame_filename = f"frame_{frame_count:04d}.jpg"
-                frame_path = os.path.join(output_dir, frame_filename)
-                cv2.imwrite(frame_path, frame)
+        pending = deque()
+        # cv2.imwrite liberta o GIL, por isso as threads codificam em paralelo com a descodificação.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for frame_count, frame in enumerate(frames):
+                frame_path = os.path.join(output_dir, f"frame_{frame_count:04d}.jpg")
+                pending.append(executor.submit(cv2.imwrite, frame_path, frame))
                 keyframes.append(frame_path)
-                frame_count += 1
-            
-            count += 1
+                if len(pending) >= MAX_PENDING_WRITES:
+                    pending.popleft().result()
+            for future in pending:
+                future.result()
         
         cap.release()
-        logger.info(f"Extracted {len(keyframes)} keyframes from video")
+        logger.info(f"Extracted {len(keyframes)} keyframes from video ({mode} mode)")
         return keyframes
     except Exception as e:
         logger.error(f"Error extracting keyframes: {str(e)}")
@@ -1,18 +1,19 @@
 # backend/shared/services/blob_storage.py
-from azure.storage.blob import BlobServiceClient
 import os
 import logging
 import shutil
 
+from .clients import get_blob_service_client, get_container_client
+
 logger = logging.getLogger(__name__)
 
 def get_blob_service():
-    conn_str = os.getenv("AzureWebJobsStorage")
-    return BlobServiceClient.from_connection_string(conn_str)
+    # Cliente partilhado pelo processo (ver clients.py)
+    return get_blob_service_client()
 
 def get_blob_client(container_name, blob_name):
-    service = get_blob_service()
-    return service.get_blob_client(container=container_name, blob=blob_name)
+    # O cliente de container é reutilizado; criar um BlobClient a partir dele é barato
+    return get_container_client(container_name).get_blob_client(blob_name)
 
 def get_blob_metadata(container_name, blob_name):
     try:
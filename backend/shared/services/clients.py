@@ -0,0 +1,81 @@
+# backend/shared/services/clients.py
+# Clientes do Azure partilhados por todo o processo. Cada cliente de serviço ou
+# de container é criado uma única vez por connection string e todos reutilizam
+# o mesmo transporte HTTP, com um pool de ligações dimensionado para rajadas.
+import os
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient
+from azure.data.tables import TableServiceClient
+
+logger = logging.getLogger(__name__)
+
+# Ligações mantidas abertas por host (blob e table são hosts diferentes).
+HTTP_POOL_SIZE = int(os.getenv("AZURE_HTTP_POOL_SIZE", "32"))
+
+_lock = threading.Lock()
+_transport = None
+_blob_services = {}
+_table_services = {}
+_container_clients = {}
+_table_clients = {}
+
+def _connection_string(conn_str):
+    return conn_str or os.getenv("AzureWebJobsStorage")
+
+def get_transport():
+    global _transport
+    with _lock:
+        if _transport is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # session_owner=False: nenhum cliente fecha a sessão partilhada.
+            _transport = RequestsTransport(session=session, session_owner=False)
+            logger.info(f"HTTP transport created with pool size {HTTP_POOL_SIZE}")
+        return _transport
+
+def get_blob_service_client(conn_str=None):
+    conn_str = _connection_string(conn_str)
+    client = _blob_services.get(conn_str)
+    if client is None:
+        transport = get_transport()
+        with _lock:
+            client = _blob_services.setdefault(
+                conn_str, BlobServiceClient.from_connection_string(conn_str, transport=transport)
+            )
+    return client
+
+def get_table_service_client(conn_str=None):
+    conn_str = _connection_string(conn_str)
+    client = _table_services.get(conn_str)
+    if client is None:
+        transport = get_transport()
+        with _lock:
+            client = _table_services.setdefault(
+                conn_str, TableServiceClient.from_connection_string(conn_str, transport=transport)
+            )
+    return client
+
+def get_container_client(container_name, conn_str=None):
+    key = (_connection_string(conn_str), container_name)
+    client = _container_clients.get(key)
+    if client is None:
+        service = get_blob_service_client(conn_str)
+        with _lock:
+            client = _container_clients.setdefault(key, service.get_container_client(container_name))
+    return client
+
+def get_table_client(table_name, conn_str=None):
+    key = (_connection_string(conn_str), table_name)
+    client = _table_clients.get(key)
+    if client is None:
+        service = get_table_service_client(conn_str)
+        with _lock:
+            client = _table_clients.setdefault(key, service.get_table_client(table_name))
+    return client
@@ -31,6 +31,10 @@ def create_app():
         # 3. AGORA, obter o cliente para a tabela específica que sabemos que existe.
         app.jobs_table_client = table_service_client.get_table_client("jobs")
         # ----------------------------------------------------------------
+
+        # Tabela de links curtos (código -> URL), preenchida pela Function App.
+        table_service_client.create_table_if_not_exists(table_name="shortlinks")
+        app.shortlinks_table_client = table_service_client.get_table_client("shortlinks")
         
         logging.info("Clientes Blob e Table Storage inicializados com sucesso.")
 
@@ -38,10 +42,12 @@ def create_app():
         logging.error("ERRO CRÍTICO: A variável de ambiente AZURE_STORAGE_CONNECTION_STRING não foi encontrada!")
         app.blob_service_client = None
         app.jobs_table_client = None
+        app.shortlinks_table_client = None
     except Exception as e:
         logging.error(f"ERRO CRÍTICO ao inicializar clientes Azure: {e}", exc_info=True)
         app.blob_service_client = None
         app.jobs_table_client = None
+        app.shortlinks_table_client = None
 
     with app.app_context():
         from . import routes
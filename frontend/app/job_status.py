@@ -0,0 +1,207 @@
+# Ficheiro: frontend/app/job_status.py
+# Leitura do estado dos jobs: formato da resposta, cache de estados, consulta
+# em massa e o observador partilhado que alimenta as ligações Server-Sent Events.
+
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+TERMINAL_STATUSES = ('completed', 'failed')
+# Intervalo entre leituras da partição de jobs feitas pelo observador.
+WATCH_INTERVAL_SECONDS = 1.0
+# Margem para diferenças de relógio entre esta máquina e o Table Storage.
+CLOCK_SKEW_SECONDS = 5
+# Cache de estados: jobs em curso expiram depressa; jobs terminados ficam até saírem do LRU.
+STATUS_CACHE_MAX_ENTRIES = 10000
+STATUS_CACHE_TTL_SECONDS = 2.0
+# O Table Storage aceita no máximo 15 comparações num $filter (uma é a PartitionKey).
+MAX_IDS_PER_QUERY = 14
+
+def is_terminal(status):
+    """Indica se o job já terminou (com sucesso ou falha) e não vai mudar mais."""
+    return (status or '').lower() in TERMINAL_STATUSES
+
+def job_payload(entity):
+    """Converte a linha da tabela de jobs na resposta enviada ao navegador."""
+    status = entity.get('status')
+    payload = {'status': status}
+    if (status or '').lower() == 'completed':
+        payload['result_url'] = entity.get('result_url') or entity.get('outputUrl')
+    elif (status or '').lower() == 'failed':
+        error_message = entity.get('error_message') or entity.get('errorMessage')
+        if error_message:
+            payload['error_message'] = error_message
+    # Resultados parciais (p. ex. páginas de um PDF já renderizadas) publicados
+    # pelo processador enquanto o job ainda está em curso.
+    if entity.get('pagesTotal'):
+        pages = {'done': entity.get('pagesDone', 0), 'total': entity['pagesTotal']}
+        if entity.get('pageManifest'):
+            base_url = entity.get('pagesBaseUrl', '')
+            pages['urls'] = [base_url + name for name in json.loads(entity['pageManifest'])]
+        payload['pages'] = pages
+    # Avanço de renders longos (p. ex. o slideshow), por fase e em percentagem.
+    if entity.get('renderStage'):
+        payload['progress'] = {'stage': entity['renderStage'], 'percent': entity.get('renderPercent', 0)}
+    if entity.get('stats'):
+        payload['stats'] = json.loads(entity['stats'])
+    return payload
+
+class StatusCache:
+    """
+    Cache LRU de payloads de estado. Estados terminais ('completed'/'failed')
+    nunca expiram, porque já não podem mudar; estados em curso expiram ao fim
+    de poucos segundos.
+    """
+
+    def __init__(self, max_entries=STATUS_CACHE_MAX_ENTRIES, ttl=STATUS_CACHE_TTL_SECONDS):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # job_id -> (payload, expira_em ou None)
+
+    def get(self, job_id):
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[job_id]
+                return None
+            self._entries.move_to_end(job_id)
+            return payload
+
+    def put(self, job_id, payload):
+        expires_at = None if is_terminal(payload.get('status')) else time.monotonic() + self._ttl
+        with self._lock:
+            self._entries[job_id] = (payload, expires_at)
+            self._entries.move_to_end(job_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+def fetch_statuses(table_client, partition_key, job_ids, cache=None):
+    """
+    Devolve {job_id: payload} para vários jobs. Os que não estão em cache são lidos
+    com queries filtradas na partição (até MAX_IDS_PER_QUERY IDs por query);
+    jobs inexistentes ficam de fora do resultado.
+    """
+    statuses = {}
+    missing = []
+    for job_id in job_ids:
+        payload = cache.get(job_id) if cache else None
+        if payload is None:
+            missing.append(job_id)
+        else:
+            statuses[job_id] = payload
+
+    for start in range(0, len(missing), MAX_IDS_PER_QUERY):
+        chunk = missing[start:start + MAX_IDS_PER_QUERY]
+        parameters = {'pk': partition_key}
+        clauses = []
+        for index, job_id in enumerate(chunk):
+            parameters[f"id{index}"] = job_id
+            clauses.append(f"RowKey eq @id{index}")
+        entities = table_client.query_entities(
+            query_filter=f"PartitionKey eq @pk and ({' or '.join(clauses)})",
+            parameters=parameters
+        )
+        for entity in entities:
+            payload = job_payload(entity)
+            statuses[entity['RowKey']] = payload
+            if cache:
+                cache.put(entity['RowKey'], payload)
+    return statuses
+
+class StatusWatcher:
+    """
+    Observador partilhado por todas as ligações deste processo. A cada intervalo
+    faz UMA query à partição de jobs (só as linhas alteradas desde a última
+    leitura) e distribui as mudanças pelas filas dos subscritores. Só publica
+    quando o estado de um job muda de facto.
+    """
+
+    def __init__(self, table_client, partition_key, interval=WATCH_INTERVAL_SECONDS, cache=None):
+        self._table_client = table_client
+        self._cache = cache
+        self._partition_key = partition_key
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._subscribers = {}  # job_id -> set de filas
+        self._last = {}         # job_id -> último payload publicado
+        self._since = None
+        self._thread = None
+
+    def subscribe(self, job_id):
+        """Regista um subscritor; a fila recebe de imediato o estado atual do job."""
+        with self._lock:
+            current = self._last.get(job_id)
+        if current is None and self._cache:
+            current = self._cache.get(job_id)
+        if current is None:
+            # Lança ResourceNotFoundError se o job não existir.
+            entity = self._table_client.get_entity(partition_key=self._partition_key, row_key=job_id)
+            current = job_payload(entity)
+
+        subscriber = queue.Queue()
+        with self._lock:
+            self._last.setdefault(job_id, current)
+            self._subscribers.setdefault(job_id, set()).add(subscriber)
+            subscriber.put(self._last[job_id])
+            self._ensure_running()
+        return subscriber
+
+    def unsubscribe(self, job_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[job_id]
+                self._last.pop(job_id, None)
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="status-watcher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                watched = set(self._subscribers)
+            if not watched:
+                self._since = None
+                continue
+            try:
+                self._poll(watched)
+            except Exception as e:
+                logging.warning(f"Observador de estado: falha ao ler a tabela de jobs: {e}")
+
+    def _poll(self, watched):
+        tick = datetime.now(timezone.utc)
+        since = self._since or tick - timedelta(seconds=self._interval)
+        # O Timestamp é mantido pelo serviço; com a margem, nenhuma alteração escapa entre leituras.
+        entities = self._table_client.query_entities(
+            query_filter="PartitionKey eq @pk and Timestamp ge @since",
+            parameters={'pk': self._partition_key, 'since': since - timedelta(seconds=CLOCK_SKEW_SECONDS)}
+        )
+        for entity in entities:
+            if entity['RowKey'] in watched:
+                payload = job_payload(entity)
+                if self._cache:
+                    self._cache.put(entity['RowKey'], payload)
+                self._publish(entity['RowKey'], payload)
+        self._since = tick
+
+    def _publish(self, job_id, payload):
+        with self._lock:
+            if self._last.get(job_id) == payload or job_id not in self._subscribers:
+                return
+            self._last[job_id] = payload
+            for subscriber in self._subscribers[job_id]:
+                subscriber.put(payload)
@@ -1,11 +1,53 @@
 import os
 import uuid
-from flask import Blueprint, render_template, request, jsonify, current_app
-from datetime import datetime
+import base64
+import json
+import queue
+import threading
+import time
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from flask import Blueprint, render_template, request, jsonify, current_app, Response, stream_with_context, redirect, abort
+from datetime import datetime, timedelta
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import generate_blob_sas, BlobSasPermissions
 import logging
 
+from .job_status import StatusWatcher, StatusCache, fetch_statuses, job_payload, is_terminal
+
 bp = Blueprint('main', __name__)
 
+# --- Constantes da Aplicação ---
+INPUT_CONTAINER = "input-files"
+# A Function App escreve o estado na mesma partição (main_handler.JOBS_PARTITION).
+JOBS_PARTITION = "image_processing"
+# Tamanho sugerido para cada bloco do upload em partes (4 MiB).
+CHUNK_SIZE = 4 * 1024 * 1024
+# Limite aceite por bloco, para que um cliente não consiga encher a memória do worker.
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Validade da SAS de escrita entregue ao navegador.
+SAS_TTL_MINUTES = 15
+# Jobs 'Pending' cuja SAS expirou sem o blob existir são marcados como falhados;
+# a limpeza corre no máximo uma vez por este intervalo.
+ABANDONED_UPLOAD_SWEEP_SECONDS = 60
+# Limites da submissão em lote.
+MAX_BATCH_FILES = 500
+TABLE_TRANSACTION_LIMIT = 100
+BATCH_UPLOAD_WORKERS = 8
+# Intervalo dos comentários keep-alive enviados nas ligações SSE.
+SSE_HEARTBEAT_SECONDS = 15
+# Máximo de jobs por pedido ao endpoint de estado em massa.
+MAX_STATUS_IDS = 100
+# Links curtos: a partição usada pela Function App e o tamanho da cache de leitura.
+SHORTLINKS_PARTITION = "links"
+SHORTLINK_CACHE_SIZE = 4096
+MAX_SHORTLINK_CODE_LENGTH = 16
+
+_watcher_lock = threading.Lock()
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
 @bp.route('/')
 def index():
     return render_template('index.html', title='Upload de Ficheiro')
@@ -34,19 +76,19 @@ def upload_file():
         blob_name = f"{job_id}{file_extension}"
 
         job_entity = {
-            'PartitionKey': 'image_processing', 'RowKey': job_id,
+            'PartitionKey': JOBS_PARTITION, 'RowKey': job_id,
             'status': 'Pending', 'original_filename': file.filename,
             'operation': operation, 'timestamp': datetime.utcnow().isoformat()
         }
         jobs_table_client.create_entity(entity=job_entity)
         logging.info(f"Job {job_id} criado na tabela com status 'Pending'.")
 
-        input_container_name = "input-files"
-        blob_client = blob_service_client.get_blob_client(container=input_container_name, blob=blob_name)
+        blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=blob_name)
 
-        metadata = {'operation': operation, 'original_filename': file.filename}
-        blob_client.upload_blob(file.read(), metadata=metadata, overwrite=True)
-        logging.info(f"Ficheiro para o job {job_id} enviado para o container '{input_container_name}'.")
+        # Passa o stream (e não file.read()) para que o SDK envie o ficheiro em blocos.
+        metadata = {'operation': operation, 'original_filename': quote(file.filename, safe='')}
+        blob_client.upload_blob(file.stream, metadata=metadata, overwrite=True)
+        logging.info(f"Ficheiro para o job {job_id} enviado para o container '{INPUT_CONTAINER}'.")
 
         return jsonify({'job_id': job_id})
 
@@ -54,6 +96,417 @@ def upload_file():
         logging.error(f"Erro na rota /upload: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+#================================================================================
+# UPLOAD EM PARTES (init / put-chunk / commit)
+#================================================================================
+# Cada parte é enviada diretamente para o blob de entrada como um bloco
+# (stage_block) e só no commit a lista de blocos é confirmada. Como o blob só
+# passa a existir no commit, o evento BlobCreated não dispara com ficheiros parciais.
+
+def _block_id(index):
+    """Gera o ID do bloco (base64 de comprimento fixo) para a parte 'index'."""
+    return base64.b64encode(f"{index:08d}".encode()).decode()
+
+def _block_index(block_id):
+    return int(base64.b64decode(block_id).decode())
+
+def _get_upload_job(jobs_table_client, job_id):
+    """Obtém a linha do job e confirma que ainda está a receber partes."""
+    entity = jobs_table_client.get_entity(partition_key=JOBS_PARTITION, row_key=job_id)
+    if entity.get('status') != 'Uploading':
+        raise ValueError(f"O job {job_id} não está a aceitar partes (status: {entity.get('status')}).")
+    return entity
+
+def _staged_indexes(blob_client):
+    """Devolve os índices das partes já recebidas (blocos ainda não confirmados)."""
+    try:
+        _, uncommitted = blob_client.get_block_list('uncommitted')
+    except ResourceNotFoundError:
+        return []
+    return sorted(_block_index(block.id) for block in uncommitted)
+
+@bp.route('/uploads', methods=['POST'])
+def init_upload():
+    """Cria o job e devolve o ID e o tamanho de parte a usar."""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+
+    if not filename:
+        return jsonify({'error': 'Nome do ficheiro vazio'}), 400
+
+    try:
+        jobs_table_client = current_app.jobs_table_client
+        if not jobs_table_client or not current_app.blob_service_client:
+            raise ConnectionError("Os serviços de armazenamento não foram inicializados.")
+
+        job_id = str(uuid.uuid4())
+        job_entity = _new_job_entity(job_id, filename, data.get('operation', 'unknown'), data.get('params'), status='Uploading')
+        jobs_table_client.create_entity(entity=job_entity)
+        logging.info(f"Upload em partes iniciado para o job {job_id}.")
+
+        return jsonify({'job_id': job_id, 'chunk_size': CHUNK_SIZE})
+
+    except Exception as e:
+        logging.error(f"Erro na rota /uploads: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/uploads/<job_id>', methods=['GET'])
+def get_upload(job_id):
+    """Lista as partes já recebidas, para que o cliente retome o upload."""
+    try:
+        entity = _get_upload_job(current_app.jobs_table_client, job_id)
+        blob_client = current_app.blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=entity['blob_name'])
+        return jsonify({'job_id': job_id, 'chunk_size': CHUNK_SIZE, 'received': _staged_indexes(blob_client)})
+
+    except ResourceNotFoundError:
+        return jsonify({'error': f"Job {job_id} não encontrado."}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logging.error(f"Erro ao consultar o upload do job {job_id}: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/uploads/<job_id>/chunks/<int:index>', methods=['PUT'])
+def put_chunk(job_id, index):
+    """Envia uma parte diretamente do corpo do pedido para o Blob Storage."""
+    length = request.content_length
+    if not length:
+        return jsonify({'error': 'A parte enviada está vazia ou sem Content-Length.'}), 411
+    if length > MAX_CHUNK_SIZE:
+        return jsonify({'error': f"A parte excede o limite de {MAX_CHUNK_SIZE} bytes."}), 413
+
+    try:
+        entity = _get_upload_job(current_app.jobs_table_client, job_id)
+        blob_client = current_app.blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=entity['blob_name'])
+
+        # O corpo é lido do socket à medida que é enviado, sem passar pela memória inteiro.
+        blob_client.stage_block(block_id=_block_id(index), data=request.stream, length=length)
+        return jsonify({'job_id': job_id, 'index': index})
+
+    except ResourceNotFoundError:
+        return jsonify({'error': f"Job {job_id} não encontrado."}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logging.error(f"Erro ao receber a parte {index} do job {job_id}: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/uploads/<job_id>/commit', methods=['POST'])
+def commit_upload(job_id):
+    """Confirma a lista de blocos; se faltar alguma parte, devolve quais faltam."""
+    data = request.get_json(silent=True) or {}
+    total_chunks = data.get('total_chunks')
+    if not isinstance(total_chunks, int) or total_chunks < 0:
+        return jsonify({'error': "O campo 'total_chunks' é obrigatório."}), 400
+
+    try:
+        jobs_table_client = current_app.jobs_table_client
+        entity = _get_upload_job(jobs_table_client, job_id)
+        blob_client = current_app.blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=entity['blob_name'])
+
+        received = set(_staged_indexes(blob_client))
+        missing = [i for i in range(total_chunks) if i not in received]
+        if missing:
+            return jsonify({'error': 'Faltam partes do ficheiro.', 'missing': missing}), 409
+
+        # A partir daqui o blob existe e o evento BlobCreated aciona a função.
+        blob_client.commit_block_list([_block_id(i) for i in range(total_chunks)], metadata=_blob_metadata(entity))
+
+        entity['status'] = 'Pending'
+        jobs_table_client.update_entity(entity=entity)
+        logging.info(f"Upload do job {job_id} concluído com {total_chunks} partes.")
+
+        return jsonify({'job_id': job_id})
+
+    except ResourceNotFoundError:
+        return jsonify({'error': f"Job {job_id} não encontrado."}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logging.error(f"Erro ao confirmar o upload do job {job_id}: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+#================================================================================
+# UPLOAD DIRETO PARA O STORAGE (SAS)
+#================================================================================
+# O navegador envia o ficheiro diretamente para o Blob Storage com uma SAS de
+# escrita de curta duração; o web app só trata pedidos JSON pequenos.
+
+def _metadata_headers(metadata):
+    """Converte os metadados do blob nos cabeçalhos x-ms-meta-* do pedido de upload."""
+    return {f"x-ms-meta-{key}": value for key, value in metadata.items()}
+
+def _new_job_entity(job_id, filename, operation, params, status='Pending'):
+    job_entity = {
+        'PartitionKey': JOBS_PARTITION, 'RowKey': job_id,
+        'status': status, 'original_filename': filename,
+        'operation': operation, 'blob_name': f"{job_id}{os.path.splitext(filename)[1]}",
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    if params:
+        job_entity['params'] = str(params)
+    return job_entity
+
+def _blob_metadata(job_entity):
+    # Os metadados de um blob só aceitam ASCII: o nome original vai percent-encoded.
+    metadata = {'operation': job_entity['operation'], 'original_filename': quote(job_entity['original_filename'], safe='')}
+    if job_entity.get('params'):
+        metadata['params'] = job_entity['params']
+    return metadata
+
+def _upload_slot(blob_service_client, account_key, job_entity, expiry):
+    """Gera a URL SAS (só criar/escrever este blob) e os cabeçalhos para o upload do job."""
+    sas_token = generate_blob_sas(
+        account_name=blob_service_client.account_name,
+        container_name=INPUT_CONTAINER,
+        blob_name=job_entity['blob_name'],
+        account_key=account_key,
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=expiry
+    )
+    blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=job_entity['blob_name'])
+    return {
+        'job_id': job_entity['RowKey'],
+        'upload_url': f"{blob_client.url}?{sas_token}",
+        'headers': _metadata_headers(_blob_metadata(job_entity)),
+        'block_size': CHUNK_SIZE,
+        'expires_at': expiry.isoformat() + 'Z'
+    }
+
+@bp.route('/uploads/sas', methods=['POST'])
+def create_upload_sas():
+    """Cria o job e devolve uma URL SAS só de escrita para o blob de entrada."""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+
+    if not filename:
+        return jsonify({'error': 'Nome do ficheiro vazio'}), 400
+
+    try:
+        jobs_table_client = current_app.jobs_table_client
+        blob_service_client = current_app.blob_service_client
+        if not jobs_table_client or not blob_service_client:
+            raise ConnectionError("Os serviços de armazenamento não foram inicializados.")
+
+        account_key = getattr(blob_service_client.credential, 'account_key', None)
+        if not account_key:
+            return jsonify({'error': 'A conta de armazenamento não permite gerar SAS.'}), 501
+
+        _sweep_abandoned_uploads()
+
+        job_id = str(uuid.uuid4())
+        expiry = datetime.utcnow() + timedelta(minutes=SAS_TTL_MINUTES)
+        job_entity = _new_job_entity(job_id, filename, data.get('operation', 'unknown'), data.get('params'))
+        # Depois disto, sem blob, o upload já não pode acontecer (ver _sweep_abandoned_uploads).
+        job_entity['upload_expires_at'] = expiry.isoformat()
+        jobs_table_client.create_entity(entity=job_entity)
+
+        logging.info(f"SAS de upload emitida para o job {job_id} (expira em {expiry.isoformat()}).")
+        return jsonify(_upload_slot(blob_service_client, account_key, job_entity, expiry))
+
+    except Exception as e:
+        logging.error(f"Erro na rota /uploads/sas: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+def _fail_abandoned_uploads(jobs_table_client, blob_service_client):
+    """Marca como falhados os jobs 'Pending' cuja SAS expirou sem que o blob tenha sido criado."""
+    expired = jobs_table_client.query_entities(
+        query_filter="PartitionKey eq @pk and status eq 'Pending' and upload_expires_at lt @now",
+        parameters={'pk': JOBS_PARTITION, 'now': datetime.utcnow().isoformat()},
+        select=['RowKey', 'blob_name']
+    )
+    for entity in expired:
+        blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=entity['blob_name'])
+        if blob_client.exists():
+            # O upload terminou; o evento BlobCreated ainda vai acionar o job.
+            continue
+        jobs_table_client.update_entity(entity={
+            'PartitionKey': JOBS_PARTITION, 'RowKey': entity['RowKey'],
+            'status': 'Failed', 'error_message': 'O upload não foi concluído antes de a autorização expirar.'
+        })
+        logging.info(f"Job {entity['RowKey']} marcado como falhado: upload direto abandonado.")
+
+def _sweep_abandoned_uploads():
+    """Corre _fail_abandoned_uploads em segundo plano, no máximo uma vez por intervalo."""
+    global _last_sweep
+    with _sweep_lock:
+        now = time.monotonic()
+        if now - _last_sweep < ABANDONED_UPLOAD_SWEEP_SECONDS:
+            return
+        _last_sweep = now
+    jobs_table_client, blob_service_client = current_app.jobs_table_client, current_app.blob_service_client
+    if not jobs_table_client or not blob_service_client:
+        return
+
+    def sweep():
+        try:
+            _fail_abandoned_uploads(jobs_table_client, blob_service_client)
+        except Exception as e:
+            logging.warning(f"Falha ao limpar uploads abandonados: {e}")
+
+    threading.Thread(target=sweep, name="abandoned-uploads", daemon=True).start()
+
+#================================================================================
+# SUBMISSÃO EM LOTE
+#================================================================================
+# Os IDs dos jobs de um lote são '{batch_id}-{n:04d}', por isso o lote inteiro
+# pode ser consultado com uma única query por intervalo de RowKey.
+
+def _batch_job_id(batch_id, index):
+    return f"{batch_id}-{index:04d}"
+
+def _insert_jobs(jobs_table_client, job_entities):
+    """Insere as linhas dos jobs em transações de até 100 entidades (limite do Table Storage)."""
+    for start in range(0, len(job_entities), TABLE_TRANSACTION_LIMIT):
+        chunk = job_entities[start:start + TABLE_TRANSACTION_LIMIT]
+        jobs_table_client.submit_transaction([("create", entity) for entity in chunk])
+
+def _upload_batch_file(blob_service_client, job_entity, stream):
+    blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=job_entity['blob_name'])
+    blob_client.upload_blob(stream, metadata=_blob_metadata(job_entity), overwrite=True)
+
+@bp.route('/batches', methods=['POST'])
+def submit_batch():
+    """
+    Submete vários ficheiros de uma só vez. Aceita multipart com vários 'files'
+    (enviados pelo servidor) ou JSON com uma lista de 'filenames' (devolve uma
+    SAS por ficheiro, para upload direto).
+    """
+    if request.files:
+        files = [f for f in request.files.getlist('files') if f.filename]
+        filenames = [f.filename for f in files]
+        operation = request.form.get('operation', 'unknown')
+        params = request.form.get('params')
+    else:
+        data = request.get_json(silent=True) or {}
+        files = None
+        filenames = [name for name in data.get('filenames', []) if name]
+        operation = data.get('operation', 'unknown')
+        params = data.get('params')
+
+    if not filenames:
+        return jsonify({'error': 'Nenhum ficheiro selecionado'}), 400
+    if len(filenames) > MAX_BATCH_FILES:
+        return jsonify({'error': f"O lote excede o limite de {MAX_BATCH_FILES} ficheiros."}), 413
+
+    try:
+        jobs_table_client = current_app.jobs_table_client
+        blob_service_client = current_app.blob_service_client
+        if not jobs_table_client or not blob_service_client:
+            raise ConnectionError("Os serviços de armazenamento não foram inicializados.")
+
+        account_key = None
+        if files is None:
+            account_key = getattr(blob_service_client.credential, 'account_key', None)
+            if not account_key:
+                return jsonify({'error': 'A conta de armazenamento não permite gerar SAS.'}), 501
+
+        batch_id = str(uuid.uuid4())
+        job_entities = []
+        for index, filename in enumerate(filenames):
+            job_entity = _new_job_entity(_batch_job_id(batch_id, index), filename, operation, params)
+            job_entity['batch_id'] = batch_id
+            job_entities.append(job_entity)
+
+        _insert_jobs(jobs_table_client, job_entities)
+        logging.info(f"Lote {batch_id} criado com {len(job_entities)} jobs.")
+
+        job_ids = [entity['RowKey'] for entity in job_entities]
+        if files is None:
+            expiry = datetime.utcnow() + timedelta(minutes=SAS_TTL_MINUTES)
+            slots = [_upload_slot(blob_service_client, account_key, entity, expiry) for entity in job_entities]
+            return jsonify({'batch_id': batch_id, 'job_ids': job_ids, 'uploads': slots})
+
+        # Uploads em paralelo, com um número limitado de ligações simultâneas.
+        failed = {}
+        with ThreadPoolExecutor(max_workers=BATCH_UPLOAD_WORKERS) as executor:
+            futures = {
+                executor.submit(_upload_batch_file, blob_service_client, entity, file.stream): entity
+                for entity, file in zip(job_entities, files)
+            }
+            for future in as_completed(futures):
+                entity = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Falha no upload do job {entity['RowKey']} do lote {batch_id}: {e}")
+                    failed[entity['RowKey']] = str(e)
+
+        for job_id, error in failed.items():
+            jobs_table_client.update_entity(entity={
+                'PartitionKey': JOBS_PARTITION, 'RowKey': job_id,
+                'status': 'Failed', 'error_message': error
+            })
+
+        return jsonify({'batch_id': batch_id, 'job_ids': job_ids, 'failed': sorted(failed)})
+
+    except Exception as e:
+        logging.error(f"Erro na rota /batches: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/batches/<batch_id>', methods=['GET'])
+def get_batch_status(batch_id):
+    """Estado de todos os jobs do lote, obtido numa única query por intervalo de RowKey."""
+    try:
+        jobs_table_client = current_app.jobs_table_client
+        if not jobs_table_client:
+            raise ConnectionError("O serviço de tabela não foi inicializado.")
+
+        # '.' vem logo a seguir a '-' em ASCII, por isso o intervalo cobre só este lote.
+        entities = jobs_table_client.query_entities(
+            query_filter="PartitionKey eq @pk and RowKey gt @start and RowKey lt @end",
+            parameters={'pk': JOBS_PARTITION, 'start': f"{batch_id}-", 'end': f"{batch_id}."},
+            select=['RowKey', 'status', 'result_url', 'outputUrl', 'error_message', 'errorMessage']
+        )
+
+        jobs = {}
+        counts = {}
+        for entity in entities:
+            status = entity.get('status')
+            counts[status] = counts.get(status, 0) + 1
+            # A Function App escreve 'completed'/'outputUrl'; job_payload aceita as duas formas.
+            jobs[entity['RowKey']] = job_payload(entity)
+
+        if not jobs:
+            return jsonify({'error': f"Lote {batch_id} não encontrado."}), 404
+        return jsonify({'batch_id': batch_id, 'total': len(jobs), 'counts': counts, 'jobs': jobs})
+
+    except Exception as e:
+        logging.error(f"Erro ao consultar o lote {batch_id}: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+def _status_cache():
+    """Cache de estados partilhada por todos os pedidos deste processo."""
+    with _watcher_lock:
+        cache = current_app.extensions.get('status_cache')
+        if cache is None:
+            cache = StatusCache()
+            current_app.extensions['status_cache'] = cache
+        return cache
+
+@bp.route('/status', methods=['GET'])
+def get_statuses():
+    """Estado de vários jobs: /status?ids=a,b,c"""
+    job_ids = list(dict.fromkeys(i.strip() for i in request.args.get('ids', '').split(',') if i.strip()))
+    if not job_ids:
+        return jsonify({'error': "O parâmetro 'ids' é obrigatório."}), 400
+    if len(job_ids) > MAX_STATUS_IDS:
+        return jsonify({'error': f"Máximo de {MAX_STATUS_IDS} jobs por pedido."}), 413
+
+    try:
+        jobs_table_client = current_app.jobs_table_client
+        if not jobs_table_client:
+            raise ConnectionError("O serviço de tabela não foi inicializado.")
+
+        _sweep_abandoned_uploads()
+        statuses = fetch_statuses(jobs_table_client, JOBS_PARTITION, job_ids, cache=_status_cache())
+        jobs = {job_id: statuses.get(job_id, {'status': 'Not Found'}) for job_id in job_ids}
+        return jsonify({'jobs': jobs})
+
+    except Exception as e:
+        logging.error(f"Erro ao consultar o estado de {len(job_ids)} jobs: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/status/<job_id>', methods=['GET'])
 def get_status(job_id):
     try:
@@ -61,13 +514,83 @@ def get_status(job_id):
         if not jobs_table_client:
             raise ConnectionError("O serviço de tabela não foi inicializado.")
 
-        entity = jobs_table_client.get_entity(partition_key="image_processing", row_key=job_id)
-
-        response = {'status': entity.get('status')}
-        if response['status'] == 'Completed':
-            response['result_url'] = entity.get('result_url')
-        return jsonify(response)
+        _sweep_abandoned_uploads()
+        cache = _status_cache()
+        payload = cache.get(job_id)
+        if payload is None:
+            entity = jobs_table_client.get_entity(partition_key=JOBS_PARTITION, row_key=job_id)
+            payload = job_payload(entity)
+            cache.put(job_id, payload)
+        return jsonify(payload)
 
     except Exception as e:
         logging.warning(f"Não foi possível obter o status para o job {job_id}. Erro: {e}")
-        return jsonify({'status': 'Not Found', 'error': str(e)}), 404
\ No newline at end of file
+        return jsonify({'status': 'Not Found', 'error': str(e)}), 404
+
+def _status_watcher():
+    """Observador de estado partilhado por todos os pedidos deste processo."""
+    # A cache é obtida antes de tomar o lock: _status_cache() usa o mesmo lock.
+    cache = _status_cache()
+    with _watcher_lock:
+        watcher = current_app.extensions.get('status_watcher')
+        if watcher is None:
+            watcher = StatusWatcher(current_app.jobs_table_client, JOBS_PARTITION, cache=cache)
+            current_app.extensions['status_watcher'] = watcher
+        return watcher
+
+@bp.route('/status/<job_id>/events', methods=['GET'])
+def stream_status(job_id):
+    """Envia o estado do job por Server-Sent Events, apenas quando ele muda."""
+    if not current_app.jobs_table_client:
+        return jsonify({'status': 'Not Found', 'error': "O serviço de tabela não foi inicializado."}), 404
+
+    watcher = _status_watcher()
+    try:
+        subscriber = watcher.subscribe(job_id)
+    except Exception as e:
+        logging.warning(f"Não foi possível observar o job {job_id}. Erro: {e}")
+        return jsonify({'status': 'Not Found', 'error': str(e)}), 404
+
+    def events():
+        try:
+            while True:
+                try:
+                    payload = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(payload)}\n\n"
+                if is_terminal(payload.get('status')):
+                    break
+        finally:
+            watcher.unsubscribe(job_id, subscriber)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+#================================================================================
+# LINKS CURTOS
+#================================================================================
+# Os mapeamentos nunca mudam depois de criados, por isso ficam em cache sem
+# expiração. Códigos inexistentes não são guardados (a exceção não entra na cache).
+
+@lru_cache(maxsize=SHORTLINK_CACHE_SIZE)
+def _resolve_shortlink(shortlinks_table_client, code):
+    entity = shortlinks_table_client.get_entity(partition_key=SHORTLINKS_PARTITION, row_key=code)
+    return entity['url']
+
+@bp.route('/s/<code>', methods=['GET'])
+def follow_shortlink(code):
+    if not code.isalnum() or len(code) > MAX_SHORTLINK_CODE_LENGTH:
+        abort(404)
+    shortlinks_table_client = current_app.shortlinks_table_client
+    if not shortlinks_table_client:
+        abort(503)
+
+    try:
+        return redirect(_resolve_shortlink(shortlinks_table_client, code), code=302)
+    except ResourceNotFoundError:
+        abort(404)
+    except Exception as e:
+        logging.error(f"Erro ao resolver o link curto '{code}': {e}", exc_info=True)
+        abort(502)
@@ -0,0 +1,82 @@
+# Ficheiro: function_app/shared_code/clients.py
+# Clientes do Azure partilhados por todo o processo do worker. Os clientes de
+# serviço, de container e de tabela são criados uma única vez por connection
+# string e todos usam o mesmo transporte HTTP, com um pool de ligações
+# dimensionado para rajadas, em vez de repetir handshakes TLS a cada invocação.
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import BlobServiceClient
+from azure.data.tables import TableServiceClient
+
+# Ligações mantidas abertas por host (blob e table são hosts diferentes).
+HTTP_POOL_SIZE = int(os.environ.get("AZURE_HTTP_POOL_SIZE", 32))
+
+_lock = threading.Lock()
+_transport = None
+_blob_services = {}
+_table_services = {}
+_container_clients = {}
+_table_clients = {}
+
+def _connection_string(connection_string):
+    return connection_string or os.environ["AzureWebJobsStorage"]
+
+def get_transport():
+    """Transporte HTTP único do processo, sobre uma requests.Session com pool alargado."""
+    global _transport
+    with _lock:
+        if _transport is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # session_owner=False: nenhum cliente fecha a sessão partilhada.
+            _transport = RequestsTransport(session=session, session_owner=False)
+        return _transport
+
+def get_blob_service_client(connection_string=None):
+    connection_string = _connection_string(connection_string)
+    client = _blob_services.get(connection_string)
+    if client is None:
+        transport = get_transport()
+        with _lock:
+            client = _blob_services.setdefault(
+                connection_string,
+                BlobServiceClient.from_connection_string(connection_string, transport=transport)
+            )
+    return client
+
+def get_table_service_client(connection_string=None):
+    connection_string = _connection_string(connection_string)
+    client = _table_services.get(connection_string)
+    if client is None:
+        transport = get_transport()
+        with _lock:
+            client = _table_services.setdefault(
+                connection_string,
+                TableServiceClient.from_connection_string(connection_string, transport=transport)
+            )
+    return client
+
+def get_container_client(container, connection_string=None):
+    key = (_connection_string(connection_string), container)
+    client = _container_clients.get(key)
+    if client is None:
+        service = get_blob_service_client(connection_string)
+        with _lock:
+            client = _container_clients.setdefault(key, service.get_container_client(container))
+    return client
+
+def get_table_client(table, connection_string=None):
+    key = (_connection_string(connection_string), table)
+    client = _table_clients.get(key)
+    if client is None:
+        service = get_table_service_client(connection_string)
+        with _lock:
+            client = _table_clients.setdefault(key, service.get_table_client(table))
+    return client
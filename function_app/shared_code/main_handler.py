@@ -1,29 +1,59 @@
 # Ficheiro: function_app/shared_code/main_handler.py
 # Este é o "cérebro" da sua aplicação. Ele orquestra todo o processamento.
 
+import json
 import logging
 import os
-from io import BytesIO
 
-# Importa os seus "subprogramas" de processamento.
-# O 'sys.path.append' no __init__.py garante que o Python os encontre.
-from .processors import image_processor, video_processor, pdf_processor, slideshow_creator
+# Os processadores não são importados aqui: o registo de operações carrega cada
+# um apenas quando uma das suas operações é usada pela primeira vez.
+from . import operations, result_cache, shortlinks, staging, time_budget
 
 # --- Constantes da Aplicação ---
 JOBS_TABLE = "jobs"
+# Partição onde o frontend cria as linhas dos jobs (JOBS_PARTITION em
+# frontend/app/routes.py): o estado, o progresso e as métricas escritos aqui têm
+# de ir para essa mesma linha, senão nunca chegam a /status nem ao SSE.
+JOBS_PARTITION = "image_processing"
 INPUT_CONTAINER = "input-files"
 OUTPUT_CONTAINER = "output-files"
 
-def process_event(blob_name, blob_stream, blob_metadata, blob_service_client, table_client):
+def _route(operation, blob_stream, blob_service_client, blob_name, params, progress=None):
+    """Encaminha para o processador registado para a operação."""
+    handle = operations.get_handler(operation)
+    return handle(operation, blob_stream, blob_service_client, blob_name, OUTPUT_CONTAINER, params, progress=progress)
+
+def _progress_reporter(table_client, job_entity):
+    """
+    Retorna progress(**campos), que os processadores chamam para publicar resultados
+    parciais na linha do job enquanto ainda estão a trabalhar. Uma falha ao escrever
+    o progresso é só registada: não deve fazer falhar o job.
+    """
+    def progress(**fields):
+        job_entity.update(fields)
+        try:
+            table_client.upsert_entity(entity=job_entity)
+        except Exception as e:
+            logging.warning(f"HANDLER: Não foi possível atualizar o progresso do job {job_entity['RowKey']}: {e}")
+    return progress
+
+def process_event(blob_name, blob_stream, blob_metadata, blob_service_client, table_client, cache_table_client=None):
     """
     Esta é a função central que orquestra todo o processamento.
     Ela pode ser chamada por qualquer gatilho (Azure Function, servidor local, etc.).
+    Com 'cache_table_client', entradas já processadas com a mesma operação e
+    parâmetros reutilizam o resultado existente. Sem 'blob_stream' (a Azure Function,
+    acionada pelo Event Grid só com o nome do blob), a entrada é descarregada do
+    contentor de entrada pelo SDK, em blocos.
     """
+    # O orçamento de tempo dos processadores conta a partir daqui.
+    time_budget.start()
+
     # O ID do trabalho é o nome do ficheiro sem a extensão.
     job_id = os.path.splitext(blob_name)[0]
     logging.info(f"HANDLER: Processando job_id: {job_id}, ficheiro: {blob_name}")
     
-    job_entity = {"PartitionKey": "jobs", "RowKey": job_id}
+    job_entity = {"PartitionKey": JOBS_PARTITION, "RowKey": job_id}
 
     try:
         # 1. Atualiza o estado para "processando" na tabela de jobs
@@ -33,42 +63,58 @@ def process_event(blob_name, blob_stream, blob_metadata, blob_service_client, ta
 
         operation = blob_metadata.get('operation')
         params = blob_metadata.get('params')
-        result_data = None
 
         logging.info(f"HANDLER: Roteando para a operação: '{operation}'")
         
-        # 2. Roteamento para o processador correto com base no nome da operação
-        if operation.startswith('img_'):
-            result_data = image_processor.handle(operation, blob_stream, blob_service_client, blob_name, OUTPUT_CONTAINER, params)
-        elif operation.startswith('video_'):
-            result_data = video_processor.handle(operation, blob_stream, blob_service_client, blob_name, OUTPUT_CONTAINER, params)
-        elif operation.startswith('pdf_'):
-            result_data = pdf_processor.handle(operation, blob_stream, blob_service_client, blob_name, OUTPUT_CONTAINER, params)
-        elif operation == 'create_slideshow':
-            result_data = slideshow_creator.handle(operation, blob_stream, blob_service_client, blob_name, OUTPUT_CONTAINER, params)
+        # 2. Roteamento para o processador correto (ou reutilização de um resultado em cache)
+        progress = _progress_reporter(table_client, job_entity)
+        if operation in operations.REMOTE_INPUT_OPERATIONS:
+            # O processador lê só as partes do blob de que precisa: sem cópia local,
+            # sem hash do conteúdo e sem cache.
+            result_data, cache_hit = _route(operation, blob_stream, blob_service_client, blob_name, params, progress), False
         else:
-            raise ValueError(f"Operação desconhecida recebida: {operation}")
+            # A entrada é copiada uma vez, em blocos, para um StagedInput (memória até
+            # um limiar, disco acima disso); os processadores leem dessa cópia.
+            if blob_stream is not None:
+                input_stream = staging.stage_stream(blob_stream, blob_name)
+            else:
+                input_blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=blob_name)
+                input_stream = staging.stage_blob(input_blob_client, blob_name)
+            result_data, cache_hit = result_cache.run_cached(
+                cache_table_client, blob_service_client, input_stream, operation, params,
+                lambda stream: _route(operation, stream, blob_service_client, blob_name, params, progress=progress)
+            )
+        if cache_hit:
+            job_entity["cacheHit"] = True
         
         # 3. Verifica se o processamento retornou um resultado válido
         if not result_data or 'outputUrl' not in result_data:
             raise Exception("O processamento não gerou um ficheiro de saída ou não retornou uma URL.")
 
-        # 4. Se teve sucesso, atualiza o estado com o resultado
+        # 4. Regista o link curto antes de publicar o resultado: /s/<código> tem de
+        #    existir quando o job aparece como concluído, e só vale a URL devolvida
+        #    por register() (que resolve colisões). Também num cache hit: o registo
+        #    é idempotente. Sem registo (falha ou não configurado), não há URL curta.
+        short_url = shortlinks.register(result_data['outputUrl'])
+
+        # 5. Se teve sucesso, atualiza o estado com o resultado
         job_entity["status"] = "completed"
         job_entity["outputUrl"] = result_data.get('outputUrl')
-        if result_data.get('shortUrl'): # Adiciona a URL curta se existir
-            job_entity["shortUrl"] = result_data.get('shortUrl')
+        if short_url:
+            job_entity["shortUrl"] = short_url
+        if result_data.get('stats'): # Métricas do processador (tamanhos, tempos, caminho seguido)
+            job_entity["stats"] = json.dumps(result_data['stats'])
             
         table_client.upsert_entity(entity=job_entity)
         logging.info(f"HANDLER: Job {job_id} concluído com sucesso.")
 
-        # 5. Exclui o ficheiro de entrada após o sucesso
+        # 6. Exclui o ficheiro de entrada após o sucesso
         input_blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=blob_name)
         input_blob_client.delete_blob()
         logging.info(f"HANDLER: Ficheiro de entrada '{blob_name}' excluído com sucesso.")
 
     except Exception as e:
-        # 6. Em caso de erro, regista a falha de forma detalhada
+        # 7. Em caso de erro, regista a falha de forma detalhada
         logging.error(f"HANDLER: Falha no processamento do job {job_id}: {e}", exc_info=True)
         job_entity["status"] = "failed"
         job_entity["errorMessage"] = str(e)
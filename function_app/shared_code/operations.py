@@ -0,0 +1,55 @@
+# Ficheiro: function_app/shared_code/operations.py
+# Registo declarativo das operações: nome da operação -> módulo processador.
+# Cada módulo só é importado na primeira vez que uma das suas operações corre,
+# para que um cold start de 'img_to_bw' não pague o import do PyMuPDF.
+
+import importlib
+import logging
+import threading
+import time
+
+OPERATIONS = {
+    'img_to_bw': 'image_processor',
+    'img_to_sepia': 'image_processor',
+    'img_pipeline': 'image_processor',
+    'img_batch_bw': 'image_batch_processor',
+    'img_batch_sepia': 'image_batch_processor',
+    'img_batch_pipeline': 'image_batch_processor',
+    'video_to_mp4': 'video_processor',
+    'generate_thumbnail': 'video_processor',
+    'video_sprites': 'video_processor',
+    'pdf_to_images': 'pdf_processor',
+    'merge_pdfs': 'pdf_processor',
+    'pdf_optimize': 'pdf_processor',
+    'create_slideshow': 'slideshow_creator',
+}
+
+PROCESSOR_MODULES = sorted(set(OPERATIONS.values()))
+
+# Operações que leem só partes do blob de entrada, por URL (pedidos por intervalos).
+# O gestor não as prepara nem calcula o hash do conteúdo (o que obrigaria a ler a
+# entrada inteira), por isso também não passam pela cache de resultados.
+REMOTE_INPUT_OPERATIONS = {'generate_thumbnail'}
+
+_loaded = {}
+_lock = threading.Lock()
+
+def load_processor(module_name):
+    """Importa (uma única vez por processo) o módulo processador indicado."""
+    module = _loaded.get(module_name)
+    if module is not None:
+        return module
+    with _lock:
+        if module_name not in _loaded:
+            start = time.perf_counter()
+            _loaded[module_name] = importlib.import_module(f"{__package__}.processors.{module_name}")
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logging.info(f"REGISTO: Processador '{module_name}' importado em {elapsed_ms:.0f} ms.")
+        return _loaded[module_name]
+
+def get_handler(operation):
+    """Devolve a função 'handle' do processador responsável pela operação."""
+    module_name = OPERATIONS.get(operation)
+    if module_name is None:
+        raise ValueError(f"Operação desconhecida recebida: {operation}")
+    return load_processor(module_name).handle
@@ -0,0 +1,117 @@
+# Ficheiro: function_app/shared_code/processors/common.py
+# Utilitários partilhados pelos processadores.
+
+import base64
+import io
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+from ..shortlinks import shorten_url
+
+# Tamanho de cada bloco enviado por BlockBlobWriter (o serviço aceita até 4000 MiB).
+BLOCK_SIZE = 4 * 1024 * 1024
+
+def blob_urls(blob_client):
+    """URLs (longa e curta) de um blob de saída já enviado."""
+    long_url = blob_client.url
+    # O código curto é só o provável, calculado localmente: a URL publicada no job
+    # é a que o gestor obtém ao registar o link, antes de o marcar como concluído.
+    return {"outputUrl": long_url, "shortUrl": shorten_url(long_url)}
+
+def read_url(blob_service_client, container, blob_name, ttl_minutes=15):
+    """
+    URL com SAS só de leitura para ferramentas externas (p. ex. o ffmpeg) lerem um
+    blob diretamente, com pedidos por intervalos. None se o cliente não tiver a
+    chave da conta (nesse caso o processador usa o stream que recebeu).
+    """
+    credential = blob_service_client.credential
+    account_key = getattr(credential, 'account_key', None)
+    if not account_key:
+        return None
+    sas_token = generate_blob_sas(
+        account_name=blob_service_client.account_name, container_name=container, blob_name=blob_name,
+        account_key=account_key, permission=BlobSasPermissions(read=True),
+        expiry=datetime.now(timezone.utc) + timedelta(minutes=ttl_minutes)
+    )
+    blob_client = blob_service_client.get_blob_client(container=container, blob=blob_name)
+    return f"{blob_client.url}?{sas_token}"
+
+def upload_and_get_urls(stream, blob_name, container, blob_service_client):
+    """Faz o upload de um stream para um blob e retorna as URLs (longa e curta)."""
+    output_blob_client = blob_service_client.get_blob_client(container=container, blob=blob_name)
+    output_blob_client.upload_blob(stream, overwrite=True)
+    logging.info(f"Ficheiro processado salvo em {container}/{blob_name}")
+    return blob_urls(output_blob_client)
+
+class BlockBlobWriter(io.RawIOBase):
+    """
+    Ficheiro só de escrita que envia os dados para um block blob à medida que são
+    escritos: cada BLOCK_SIZE bytes viram um bloco (stage_block) e close() faz o
+    commit da lista. A memória usada é um bloco, qualquer que seja o tamanho final.
+    Não é seekable, por isso zipfile.ZipFile(writer, 'w') usa data descriptors.
+    """
+
+    def __init__(self, blob_name, container, blob_service_client, block_size=BLOCK_SIZE):
+        self.blob_client = blob_service_client.get_blob_client(container=container, blob=blob_name)
+        self.blob_name = blob_name
+        self.container = container
+        self.block_size = block_size
+        self._buffer = bytearray()
+        self._block_ids = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("Escrita num BlockBlobWriter já fechado.")
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.block_size:
+            self._stage(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return len(data)
+
+    def _stage(self, chunk):
+        block_id = base64.b64encode(f"{len(self._block_ids):08d}".encode()).decode()
+        self.blob_client.stage_block(block_id=block_id, data=chunk, length=len(chunk))
+        self._block_ids.append(block_id)
+
+    def close(self):
+        if self.closed:
+            return
+        if self._buffer:
+            self._stage(bytes(self._buffer))
+            self._buffer.clear()
+        self.blob_client.commit_block_list(self._block_ids)
+        logging.info(f"Ficheiro processado salvo em {self.container}/{self.blob_name} ({len(self._block_ids)} blocos).")
+        super().close()
+
+    def abort(self):
+        """Fecha sem commit: os blocos pendentes são descartados pelo serviço."""
+        self._buffer.clear()
+        super().close()
+
+    def urls(self):
+        return blob_urls(self.blob_client)
+
+def parse_params(params):
+    """Converte o campo 'params' dos metadados do blob (JSON) num dicionário."""
+    if not params:
+        return {}
+    if isinstance(params, dict):
+        return params
+    try:
+        value = json.loads(params)
+    except ValueError:
+        raise ValueError(f"Parâmetros inválidos (esperado um objeto JSON): {params}")
+    if not isinstance(value, dict):
+        raise ValueError(f"Parâmetros inválidos (esperado um objeto JSON): {params}")
+    return value
@@ -0,0 +1,119 @@
+# Ficheiro: function_app/shared_code/processors/filters.py
+# Motor de filtros de cor baseado em tabelas de consulta (LUT) pré-calculadas.
+# Uma sequência de filtros é compilada em poucos estágios e cada estágio é uma
+# única passagem em C sobre a imagem (Image.point), sem cópias intermédias.
+#
+# Filtros: grayscale, sepia, tint {"color": "#RRGGBB"},
+#          brightness {"factor": 1.2}, contrast {"factor": 1.3}
+
+from PIL import Image, ImageColor
+
+COLOR_OPS = ('grayscale', 'sepia', 'tint', 'brightness', 'contrast')
+IDENTITY = list(range(256))
+SEPIA_BLACK = (0x70, 0x42, 0x14)  # '#704214'
+SEPIA_WHITE = (0xC0, 0xA0, 0x80)  # '#C0A080'
+
+def _clamp(value):
+    return 0 if value < 0 else 255 if value > 255 else int(value)
+
+def _luma(r, g, b):
+    """Luminância ITU-R 601-2, a mesma usada por Image.convert('L')."""
+    return (r * 299 + g * 587 + b * 114 + 500) // 1000
+
+def colorize_luts(black, white):
+    """LUTs R, G, B equivalentes a ImageOps.colorize(black, white) sobre uma imagem 'L'."""
+    luts = []
+    for channel in range(3):
+        lut = [black[channel] + i * (white[channel] - black[channel]) // 255 for i in range(255)]
+        lut.append(white[channel])
+        luts.append(lut)
+    return luts
+
+def _tint_luts(color):
+    """Gradiente preto -> cor (nos tons médios) -> branco."""
+    mid = ImageColor.getrgb(color)[:3]
+    luts = []
+    for channel in range(3):
+        lut = []
+        for i in range(256):
+            if i < 128:
+                lut.append(mid[channel] * i // 127 if i < 127 else mid[channel])
+            else:
+                lut.append(mid[channel] + (255 - mid[channel]) * (i - 127) // 128)
+        luts.append(lut)
+    return luts
+
+def _channel_lut(step):
+    """LUT aplicada igualmente a cada canal (brilho e contraste)."""
+    factor = float(step.get('factor', 1.0))
+    if step['op'] == 'brightness':
+        return [_clamp(round(v * factor)) for v in range(256)]
+    return [_clamp(round((v - 128) * factor + 128)) for v in range(256)]
+
+def _gray_of(luts):
+    """Reduz LUTs de saída RGB à luminância resultante (uma LUT 'L')."""
+    if len(luts) == 1:
+        return luts[0]
+    return [_luma(luts[0][i], luts[1][i], luts[2][i]) for i in range(256)]
+
+def compile_filters(steps):
+    """
+    Compila a sequência de filtros em estágios:
+      ('luma', [lut]) ou ('luma', [r, g, b]) - converte para 'L' e aplica as LUTs;
+      ('channels', lut)                      - a mesma LUT em todos os canais.
+    Filtros consecutivos compatíveis são fundidos num só estágio.
+    """
+    stages = []
+    state = None
+    for step in steps:
+        op = step['op']
+        if op == 'grayscale':
+            if state and state[0] == 'luma':
+                state = ('luma', [_gray_of(state[1])])
+            else:
+                if state:
+                    stages.append(state)
+                state = ('luma', [IDENTITY])
+        elif op in ('sepia', 'tint'):
+            luts = colorize_luts(SEPIA_BLACK, SEPIA_WHITE) if op == 'sepia' else _tint_luts(step.get('color', '#704214'))
+            if state and state[0] == 'luma':
+                gray = _gray_of(state[1])
+                state = ('luma', [[lut[v] for v in gray] for lut in luts])
+            else:
+                if state:
+                    stages.append(state)
+                state = ('luma', luts)
+        elif op in ('brightness', 'contrast'):
+            lut = _channel_lut(step)
+            if state is None:
+                state = ('channels', lut)
+            elif state[0] == 'channels':
+                state = ('channels', [lut[v] for v in state[1]])
+            else:
+                state = ('luma', [[lut[v] for v in out] for out in state[1]])
+        else:
+            raise ValueError(f"Filtro de cor desconhecido: {op}")
+    if state:
+        stages.append(state)
+    return stages
+
+def _apply_stage(img, stage):
+    kind, luts = stage
+    if kind == 'luma':
+        gray = img if img.mode == 'L' else img.convert('L')
+        if len(luts) == 1:
+            return gray if luts[0] == IDENTITY else gray.point(luts[0])
+        return Image.merge('RGB', [gray.point(lut) for lut in luts])
+
+    # 'channels': a mesma LUT em cada canal de cor; o alfa fica intacto.
+    if img.mode in ('L', 'RGB'):
+        return img.point(luts * len(img.getbands()))
+    if img.mode == 'RGBA':
+        return img.point(luts * 3 + IDENTITY)
+    return img.convert('RGB').point(luts * 3)
+
+def apply_filters(img, steps):
+    """Aplica a sequência de filtros de cor com o menor número possível de passagens."""
+    for stage in compile_filters(steps):
+        img = _apply_stage(img, stage)
+    return img
@@ -0,0 +1,102 @@
+# Ficheiro: function_app/shared_code/processors/image_batch_processor.py
+# Operações de imagem em lote: recebe um ZIP com várias imagens, aplica a mesma
+# operação a cada uma num pool de processos e devolve um único ZIP de resultados.
+#
+# Os membros são lidos do ZIP um a um (sem extractall) e só há no máximo
+# pool.IN_FLIGHT_PER_WORKER imagens por processo em curso; os resultados são escritos,
+# pela ordem do ZIP original, diretamente num ZIP de saída que vai sendo enviado
+# em blocos para o blob. A memória depende da janela em curso, não do arquivo.
+
+import logging
+import os
+import zipfile
+from contextlib import closing
+from concurrent.futures.process import BrokenProcessPool
+
+from . import pool
+from .common import BlockBlobWriter, parse_params
+from .image_processor import render_bytes
+
+# --- Constantes ---
+# Operação em lote -> operação aplicada a cada imagem (ver image_processor.RENDERERS).
+BATCH_OPERATIONS = {
+    'img_batch_bw': 'img_to_bw',
+    'img_batch_sepia': 'img_to_sepia',
+    'img_batch_pipeline': 'img_pipeline',
+}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+# --- Função Principal do Processador ---
+def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params, progress=None):
+    logging.info(f"PROCESSADOR DE LOTE: A manusear a operação '{operation}'.")
+    if operation in BATCH_OPERATIONS:
+        return process_zip(blob_stream, blob_service_client, original_filename, output_container,
+                           BATCH_OPERATIONS[operation], parse_params(params))
+    else:
+        raise ValueError(f"Operação de lote desconhecida: {operation}")
+
+def _image_members(zip_ref):
+    for info in zip_ref.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+            continue
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            yield info
+
+def _output_name(member_name, out_suffix, used):
+    """
+    Nome de saída de uma imagem do lote. 'a.jpg' e 'a.png' dariam ambos 'a_bw.png':
+    em caso de colisão entra a extensão original ('a_png_bw.png') e, se ainda
+    assim colidir, um contador.
+    """
+    stem, ext = os.path.splitext(member_name)
+    name = f"{stem}{out_suffix}"
+    if name in used:
+        tagged = f"{stem}_{ext.lstrip('.').lower()}"
+        name, counter = f"{tagged}{out_suffix}", 2
+        while name in used:
+            name, counter = f"{tagged}_{counter}{out_suffix}", counter + 1
+    used.add(name)
+    return name
+
+def process_zip(blob_stream, blob_service_client, original_filename, output_container, image_operation, params):
+    """Aplica 'image_operation' a cada imagem do ZIP e envia o ZIP de resultados em streaming."""
+    base_name = os.path.splitext(original_filename)[0]
+    suffix = image_operation.split('_')[-1]
+    writer = BlockBlobWriter(f"{base_name}_{suffix}.zip", output_container, blob_service_client)
+    processed, failed = 0, []
+    used_names = set()
+
+    try:
+        # O blob de entrada já chega como um ficheiro seekable (ver staging).
+        with zipfile.ZipFile(blob_stream, 'r') as zip_in, \
+             zipfile.ZipFile(writer, 'w', compression=zipfile.ZIP_STORED) as zip_out:
+            # Cada imagem só é lida do ZIP quando há lugar na janela do pool.
+            tasks = ((info, render_bytes, image_operation, zip_in.read(info), params) for info in _image_members(zip_in))
+            with closing(pool.submit_ordered(tasks)) as results:
+                for info, future in results:
+                    try:
+                        data, out_suffix = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        logging.warning(f"PROCESSADOR DE LOTE: '{info.filename}' ignorado: {e}")
+                        failed.append(info.filename)
+                        continue
+                    # JPEG/PNG/WebP já vêm comprimidos: ZIP_STORED evita gastar CPU para nada.
+                    zip_out.writestr(_output_name(info.filename, out_suffix, used_names), data)
+                    processed += 1
+
+        if processed == 0:
+            raise ValueError("Nenhuma imagem válida (.jpg, .png, .webp, ...) encontrada no ZIP.")
+        writer.close()
+    except BrokenProcessPool:
+        pool.reset_pool()
+        writer.abort()
+        raise
+    except Exception:
+        writer.abort()
+        raise
+
+    logging.info(f"PROCESSADOR DE LOTE: {processed} imagens processadas, {len(failed)} ignoradas.")
+    return writer.urls()
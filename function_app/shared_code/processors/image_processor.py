@@ -2,81 +2,205 @@
 # Contém toda a lógica para processamento de imagens.
 
 import logging
-from PIL import Image, ImageOps
+from PIL import Image
 import os
 from io import BytesIO
-import requests
 
-# --- Função Utilitária para Encurtar URL ---
-def shorten_url(long_url):
-    """Encurta uma URL usando a API do tinyurl.com."""
-    try:
-        api_url = f"http://tinyurl.com/api-create.php?url={long_url}"
-        response = requests.get(api_url, timeout=5)
-        if response.status_code == 200:
-            logging.info(f"URL encurtada com sucesso: {response.text}")
-            return response.text
-    except Exception as e:
-        logging.warning(f"Não foi possível encurtar a URL {long_url}: {e}")
-    return None
+from .common import upload_and_get_urls, parse_params
+from . import filters
+
+# --- Constantes ---
+# Nível de compressão PNG (0-9). O padrão do Pillow (6) é bem mais lento para
+# um ganho pequeno de tamanho; pode ser alterado por job com {"compress_level": N}.
+DEFAULT_PNG_COMPRESS_LEVEL = 3
+GEOMETRY_STEPS = ('resize', 'thumbnail', 'crop', 'rotate')
+OUTPUT_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+DEFAULT_QUALITY = 85
 
 # --- Função Principal do Processador ---
-def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params):
+def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params, progress=None):
     """
     Função "gestora" que direciona para o processamento de imagem correto.
     Retorna um dicionário com 'outputUrl' e 'shortUrl'.
     """
     logging.info(f"PROCESSADOR DE IMAGEM: A manusear a operação '{operation}'.")
     if operation == 'img_to_bw':
-        return convert_to_bw(blob_stream, blob_service_client, original_filename, output_container)
+        return convert_to_bw(blob_stream, blob_service_client, original_filename, output_container, _optional_params(params))
     elif operation == 'img_to_sepia':
-        return convert_to_sepia(blob_stream, blob_service_client, original_filename, output_container)
+        return convert_to_sepia(blob_stream, blob_service_client, original_filename, output_container, _optional_params(params))
+    elif operation == 'img_pipeline':
+        return run_pipeline(blob_stream, blob_service_client, original_filename, output_container, parse_params(params))
     else:
         raise ValueError(f"Operação de imagem desconhecida: {operation}")
 
+def _optional_params(params):
+    """
+    P&B e sépia não precisam de parâmetros (só afinam a compressão): um 'params'
+    que não seja JSON é ignorado em vez de falhar o job.
+    """
+    try:
+        return parse_params(params)
+    except ValueError:
+        logging.warning(f"Parâmetros ignorados (não são um objeto JSON): {params}")
+        return {}
+
 # --- Funções de Processamento Específicas ---
-def convert_to_bw(blob_stream, blob_service_client, original_filename, output_container):
+def convert_to_bw(blob_stream, blob_service_client, original_filename, output_container, params=None):
     """Converte uma imagem para preto e branco."""
     logging.info(f"Convertendo '{original_filename}' para preto e branco.")
-    
-    img = Image.open(blob_stream).convert('L') # 'L' é o modo para P&B
-    
+    output_stream, suffix = render_bw(Image.open(blob_stream), params or {})
+    output_blob_name = f"{os.path.splitext(original_filename)[0]}{suffix}"
+    return upload_and_get_urls(output_stream, output_blob_name, output_container, blob_service_client)
+
+def convert_to_sepia(blob_stream, blob_service_client, original_filename, output_container, params=None):
+    """Aplica um filtro sépia a uma imagem (uma conversão para 'L' e uma passagem de LUT)."""
+    logging.info(f"Aplicando filtro sépia em '{original_filename}'.")
+    output_stream, suffix = render_sepia(Image.open(blob_stream), params or {})
+    output_blob_name = f"{os.path.splitext(original_filename)[0]}{suffix}"
+    return upload_and_get_urls(output_stream, output_blob_name, output_container, blob_service_client)
+
+# --- Renderização (sem I/O de blobs; também usada pelos workers de lote) ---
+def render_bw(img, params):
+    """Retorna (stream PNG em preto e branco, sufixo do nome de saída)."""
+    img = filters.apply_filters(img, [{'op': 'grayscale'}]) # 'L' é o modo para P&B
+
     output_stream = BytesIO()
-    img.save(output_stream, format='PNG')
+    img.save(output_stream, format='PNG', compress_level=int(params.get('compress_level', DEFAULT_PNG_COMPRESS_LEVEL)))
     output_stream.seek(0)
-    
-    base_name = os.path.splitext(original_filename)[0]
-    output_blob_name = f"{base_name}_bw.png"
-    
-    return _upload_and_get_urls(output_stream, output_blob_name, output_container, blob_service_client)
-
-def convert_to_sepia(blob_stream, blob_service_client, original_filename, output_container):
-    """Aplica um filtro sépia a uma imagem."""
-    logging.info(f"Aplicando filtro sépia em '{original_filename}'.")
+    return output_stream, "_bw.png"
+
+def render_sepia(img, params):
+    """Retorna (stream JPEG em sépia, sufixo do nome de saída)."""
+    sepia_img = filters.apply_filters(img, [{'op': 'sepia'}])
+
+    # Sem 'quality' nos parâmetros mantém-se o padrão do Pillow, como antes.
+    save_options = {'quality': int(params['quality'])} if 'quality' in params else {}
+    output_stream = BytesIO()
+    sepia_img.save(output_stream, format='JPEG', **save_options)
+    output_stream.seek(0)
+    return output_stream, "_sepia.jpg"
 
-    img = Image.open(blob_stream).convert('RGB')
-    sepia_img = ImageOps.colorize(ImageOps.grayscale(img), '#704214', '#C0A080')
+def render_bytes(operation, data, params):
+    """
+    Processa uma imagem já em memória e retorna (bytes de saída, sufixo).
+    Função de topo (serializável) para ser executada num ProcessPoolExecutor.
+    """
+    render = RENDERERS.get(operation)
+    if render is None:
+        raise ValueError(f"Operação de imagem desconhecida: {operation}")
+    output_stream, suffix = render(Image.open(BytesIO(data)), params)
+    return output_stream.getvalue(), suffix
+
+#================================================================================
+# PIPELINE DE IMAGEM (vários passos, uma descodificação, uma codificação)
+#================================================================================
+# params = {"steps": [{"op": "resize", "width": 800}, {"op": "sepia"}, ...],
+#           "format": "JPEG", "quality": 85, "optimize": true}
+# Passos: resize, thumbnail, crop, rotate e format (que só
+# define as opções de codificação), além dos filtros de cor de filters.py.
+# Filtros de cor consecutivos são fundidos pelo motor de filtros em LUTs.
+
+def _target_size(step, size):
+    """Calcula (largura, altura) de um passo resize/thumbnail, mantendo a proporção se faltar um lado."""
+    width, height = step.get('width'), step.get('height')
+    if not width and not height:
+        raise ValueError(f"O passo '{step['op']}' precisa de 'width' e/ou 'height'.")
+    if step['op'] == 'thumbnail':
+        # Cabe dentro da caixa pedida, sem nunca ampliar.
+        ratios = [1.0]
+        if width:
+            ratios.append(float(width) / size[0])
+        if height:
+            ratios.append(float(height) / size[1])
+        ratio = min(ratios)
+    elif not (width and height):
+        # Resize só com um lado: a proporção vem desse lado (pode ampliar).
+        ratio = float(width) / size[0] if width else float(height) / size[1]
+    else:
+        return int(width), int(height)
+    return max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio))
+
+def _apply_geometry(img, step):
+    op = step['op']
+    if op in ('resize', 'thumbnail'):
+        size = _target_size(step, img.size)
+        return img if size == img.size else img.resize(size, Image.Resampling.LANCZOS)
+    if op == 'crop':
+        box = step.get('box')
+        if not isinstance(box, (list, tuple)) or len(box) != 4:
+            raise ValueError("O passo 'crop' precisa de 'box': [esquerda, topo, direita, baixo].")
+        return img.crop(tuple(int(v) for v in box))
+    if op == 'rotate':
+        degrees = float(step.get('degrees', 0)) % 360
+        # Múltiplos de 90° são transposições exatas e muito mais rápidas que uma rotação genérica.
+        transposes = {90: Image.Transpose.ROTATE_90, 180: Image.Transpose.ROTATE_180, 270: Image.Transpose.ROTATE_270}
+        if degrees in transposes:
+            return img.transpose(transposes[degrees])
+        return img if degrees == 0 else img.rotate(degrees, resample=Image.Resampling.BICUBIC, expand=step.get('expand', True))
+    raise ValueError(f"Passo de pipeline desconhecido: {op}")
+
+def _plan(steps):
+    """Agrupa os passos: geometria um a um, cor em blocos fundidos, 'format' à parte."""
+    plan, encode, pending_color = [], {}, []
+    for step in steps:
+        op = step.get('op')
+        if op in filters.COLOR_OPS:
+            pending_color.append(step)
+            continue
+        if pending_color:
+            plan.append(('color', pending_color))
+            pending_color = []
+        if op == 'format':
+            encode.update({k: v for k, v in step.items() if k != 'op'})
+        elif op in GEOMETRY_STEPS:
+            plan.append(('geometry', step))
+        else:
+            raise ValueError(f"Passo de pipeline desconhecido: {op}")
+    if pending_color:
+        plan.append(('color', pending_color))
+    return plan, encode
+
+def run_pipeline(blob_stream, blob_service_client, original_filename, output_container, params):
+    """Aplica todos os passos sobre a mesma imagem em memória e faz um único upload."""
+    logging.info(f"Pipeline de imagem em '{original_filename}': {[s.get('op') for s in params.get('steps') or []]}.")
+    output_stream, suffix = render_pipeline(Image.open(blob_stream), params)
+    output_blob_name = f"{os.path.splitext(original_filename)[0]}{suffix}"
+    return upload_and_get_urls(output_stream, output_blob_name, output_container, blob_service_client)
+
+def render_pipeline(img, params):
+    """Retorna (stream codificado uma única vez no fim do pipeline, sufixo do nome de saída)."""
+    steps = params.get('steps') or []
+    if not steps:
+        raise ValueError("O pipeline de imagem precisa de pelo menos um passo em 'steps'.")
+    plan, encode = _plan(steps)
+    encode = {**{k: params[k] for k in ('format', 'quality', 'optimize') if k in params}, **encode}
+
+    # Se o primeiro passo reduz a imagem, o JPEG é descodificado já numa escala menor (DCT).
+    if plan and plan[0][0] == 'geometry' and plan[0][1]['op'] in ('resize', 'thumbnail'):
+        img.draft('RGB', _target_size(plan[0][1], img.size))
+
+    for kind, value in plan:
+        img = filters.apply_filters(img, value) if kind == 'color' else _apply_geometry(img, value)
+
+    output_format = str(encode.get('format') or ('PNG' if 'A' in img.getbands() else 'JPEG')).upper()
+    if output_format == 'JPG':
+        output_format = 'JPEG'
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de saída não suportado: {output_format}")
+    if output_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    save_options = {'optimize': bool(encode.get('optimize', False))}
+    if output_format in ('JPEG', 'WEBP'):
+        save_options['quality'] = int(encode.get('quality', DEFAULT_QUALITY))
 
     output_stream = BytesIO()
-    sepia_img.save(output_stream, format='JPEG')
+    img.save(output_stream, format=output_format, **save_options)
     output_stream.seek(0)
-    
-    base_name = os.path.splitext(original_filename)[0]
-    output_blob_name = f"{base_name}_sepia.jpg"
-    
-    return _upload_and_get_urls(output_stream, output_blob_name, output_container, blob_service_client)
-
-# --- Função Auxiliar ---
-def _upload_and_get_urls(stream, blob_name, container, blob_service_client):
-    """Faz o upload de um stream para um blob e retorna as URLs."""
-    output_blob_client = blob_service_client.get_blob_client(container=container, blob=blob_name)
-    output_blob_client.upload_blob(stream, overwrite=True)
-    logging.info(f"Ficheiro processado salvo em {container}/{blob_name}")
-    
-    long_url = output_blob_client.url
-    short_url = shorten_url(long_url)
-    
-    return {
-        "outputUrl": long_url,
-        "shortUrl": short_url
-    }
+    return output_stream, f"_pipeline.{OUTPUT_FORMATS[output_format]}"
+
+RENDERERS = {
+    'img_to_bw': render_bw,
+    'img_to_sepia': render_sepia,
+    'img_pipeline': render_pipeline,
+}
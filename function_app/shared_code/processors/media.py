@@ -0,0 +1,215 @@
+# Ficheiro: function_app/shared_code/processors/media.py
+# Acesso direto ao ffmpeg para os processadores de vídeo. Usa o binário estático
+# do pacote imageio-ffmpeg; como esse pacote não traz o ffprobe, a sondagem dos
+# streams lê o resumo que o próprio ffmpeg imprime com '-i'.
+
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+import imageio_ffmpeg
+
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_STREAM = re.compile(r"Stream #\d+:(\d+)(?:\[\w+\])?(?:\(\w+\))?: (Video|Audio): (\w+)(.*)")
+_SIZE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS = re.compile(r"([\d.]+) (?:fps|tbr)")
+
+# Perfis de codificação, do mais lento (melhor qualidade) ao mais rápido.
+# max_height None = resolução original. A altura máxima só se aplica quando o
+# perfil é pedido (ou escolhido por uma descida); a conversão por omissão mantém
+# a resolução da entrada, como o remux de um vídeo já em H.264.
+ENCODING_PROFILES = {
+    'archival': {'preset': 'slow', 'crf': 18, 'max_height': None, 'audio_bitrate': '192k'},
+    'balanced': {'preset': 'medium', 'crf': 23, 'max_height': 1080, 'audio_bitrate': '128k'},
+    'fast-preview': {'preset': 'veryfast', 'crf': 28, 'max_height': 480, 'audio_bitrate': '96k'},
+}
+PROFILE_ORDER = ('archival', 'balanced', 'fast-preview')
+DEFAULT_PROFILE = 'balanced'
+# Custo estimado de cada perfil: segundos de codificação por segundo de vídeo
+# (30 fps) e por megapixel de saída, num só núcleo. Medido com a libx264 sobre
+# 720p; é uma estimativa conservadora para decidir descidas de perfil.
+ENCODE_SECONDS_PER_MEGAPIXEL = {'archival': 2.1, 'balanced': 1.3, 'fast-preview': 0.6}
+AVAILABLE_CORES = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+def ffmpeg_exe():
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def _run_with_progress(command, timeout, on_progress):
+    """
+    Como subprocess.run, mas lê o relatório de '-progress pipe:1' enquanto o ffmpeg
+    corre e chama on_progress(segundos de saída já escritos). O stderr vai para um
+    ficheiro temporário para o pipe do stderr nunca encher e bloquear o processo.
+    """
+    command = command[:1] + ['-progress', 'pipe:1', '-nostats'] + command[1:]
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, text=True, errors='replace')
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                if key == 'out_time_us' and value.isdigit():
+                    on_progress(int(value) / 1_000_000)
+            process.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, timeout)
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode('utf-8', errors='replace')
+    return subprocess.CompletedProcess(command, process.returncode, '', stderr)
+
+def run_ffmpeg(args, timeout=None, on_progress=None):
+    """
+    Corre o ffmpeg com os argumentos dados; um código de saída != 0 vira RuntimeError
+    com o fim do stderr. Com 'on_progress', é chamado com os segundos já codificados.
+    """
+    command = [ffmpeg_exe(), '-hide_banner', '-nostdin', '-y', *args]
+    logging.info(f"FFMPEG: {' '.join(args)}")
+    if on_progress is None:
+        result = subprocess.run(command, capture_output=True, text=True, errors='replace', timeout=timeout)
+    else:
+        result = _run_with_progress(command, timeout, on_progress)
+    if result.returncode != 0:
+        tail = '\n'.join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"O ffmpeg falhou (código {result.returncode}): {tail}")
+    return result
+
+def _pixel_format(details):
+    """Extrai o formato de pixel ('yuv420p', ...) do texto depois do codec de vídeo."""
+    for part in details.split(','):
+        token = part.strip().split('(')[0].strip()
+        if token.startswith(('yuv', 'yuvj', 'rgb', 'bgr', 'gray', 'nv', 'p0')):
+            return token
+    return None
+
+def probe(path):
+    """
+    Lê duração e streams de um ficheiro de media. Retorna
+    {'duration': s, 'video': {'index', 'codec', 'pix_fmt', 'width', 'height', 'fps'} ou None,
+     'audio': {'index', 'codec'} ou None}, considerando o primeiro stream de cada tipo.
+    """
+    # Sem ficheiro de saída o ffmpeg termina com erro, mas o resumo da entrada já foi impresso.
+    stderr = subprocess.run([ffmpeg_exe(), '-hide_banner', '-nostdin', '-i', path],
+                            capture_output=True, text=True, errors='replace').stderr
+    if 'Invalid data found' in stderr or 'Input #0' not in stderr:
+        raise ValueError("O ficheiro de entrada não é um vídeo reconhecido.")
+
+    info = {'duration': None, 'video': None, 'audio': None}
+    match = _DURATION.search(stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    for line in stderr.splitlines():
+        match = _STREAM.search(line)
+        if not match:
+            continue
+        index, kind, codec, details = match.groups()
+        if kind == 'Video' and info['video'] is None:
+            # Capas (imagens anexadas) aparecem como streams de vídeo; não contam.
+            if 'attached pic' in details:
+                continue
+            size = _SIZE.search(details)
+            fps = _FPS.search(details)
+            info['video'] = {
+                'index': int(index), 'codec': codec, 'pix_fmt': _pixel_format(details),
+                'width': int(size.group(1)) if size else None,
+                'height': int(size.group(2)) if size else None,
+                'fps': float(fps.group(1)) if fps else None,
+            }
+        elif kind == 'Audio' and info['audio'] is None:
+            info['audio'] = {'index': int(index), 'codec': codec}
+    return info
+
+def frame_rate(fps):
+    """
+    Taxa de frames para '-r'. O resumo do ffmpeg arredonda as taxas NTSC
+    (29.97 em vez de 30000/1001), que aqui são repostas para não haver deriva.
+    """
+    ntsc = round(fps * 1.001)
+    if abs(fps - ntsc) > 0.005 and abs(fps - ntsc / 1.001) < 0.005:
+        return f"{ntsc * 1000}/1001"
+    return f"{fps:g}"
+
+def output_size(profile_name, width, height, capped=True):
+    """
+    Resolução de saída do perfil (reduz à altura máxima, mantendo a proporção e
+    dimensões pares). Com capped=False fica a da entrada.
+    """
+    max_height = ENCODING_PROFILES[profile_name]['max_height'] if capped else None
+    if not width or not height or not max_height or height <= max_height:
+        return width, height
+    return max(2, round(width * max_height / height / 2) * 2), max_height
+
+def estimate_encode_seconds(profile_name, duration, width, height, capped=True):
+    """Estimativa grosseira do tempo de codificação: duração x resolução x custo do perfil."""
+    width, height = output_size(profile_name, width or 1280, height or 720, capped)
+    megapixels = width * height / 1_000_000
+    return duration * megapixels * ENCODE_SECONDS_PER_MEGAPIXEL[profile_name] / (AVAILABLE_CORES or 1)
+
+def choose_profile(requested, duration, width, height, remaining_seconds, capped=True):
+    """
+    Valida o perfil pedido e, se a estimativa de codificação não couber no tempo
+    que resta à invocação, desce para perfis mais rápidos. Retorna (perfil, perfil
+    pedido se houve descida, senão None). 'capped' diz se o perfil pedido reduz a
+    resolução; os perfis de uma descida reduzem sempre.
+    """
+    requested = requested or DEFAULT_PROFILE
+    if requested not in ENCODING_PROFILES:
+        raise ValueError(f"Perfil de codificação desconhecido: {requested} (use {', '.join(PROFILE_ORDER)}).")
+    if remaining_seconds is None or not duration:
+        return requested, None
+
+    profile_name = requested
+    for candidate in PROFILE_ORDER[PROFILE_ORDER.index(requested):]:
+        profile_name = candidate
+        if estimate_encode_seconds(candidate, duration, width, height, capped or candidate != requested) <= remaining_seconds:
+            break
+    else:
+        logging.warning(f"Nem o perfil '{profile_name}' deve caber nos {remaining_seconds:.0f}s restantes; a tentar mesmo assim.")
+    if profile_name != requested:
+        logging.warning(f"Perfil '{requested}' não cabe nos {remaining_seconds:.0f}s restantes; a usar '{profile_name}'.")
+        return profile_name, requested
+    return profile_name, None
+
+def video_encoder_args(profile_name, width=None, height=None, threads=None, capped=True):
+    """
+    Argumentos do ffmpeg para codificar o vídeo em H.264 com o perfil dado. Sem
+    'threads', o x264 usa um por núcleo.
+    """
+    profile = ENCODING_PROFILES[profile_name]
+    args = ['-c:v', 'libx264', '-preset', profile['preset'], '-crf', str(profile['crf']), '-pix_fmt', 'yuv420p']
+    if threads:
+        args += ['-threads', str(threads)]
+    if output_size(profile_name, width, height, capped) != (width, height):
+        args += ['-vf', f"scale=-2:{profile['max_height']}"]
+    return args
+
+def audio_encoder_args(profile_name):
+    return ['-c:a', 'aac', '-b:a', ENCODING_PROFILES[profile_name]['audio_bitrate']]
+
+def extract_frame(source, output_path, seconds):
+    """
+    Guarda o frame no instante 'seconds' como JPEG. Com -ss antes de -i o ffmpeg
+    salta pelo índice do contentor (moov/cues) para o keyframe anterior e só
+    descodifica dali para a frente; se 'source' for uma URL HTTP(S), lê apenas os
+    intervalos de bytes de que precisa (cabeçalho, índice e esse GOP).
+    Retorna False se não houver frame nesse instante (vídeo mais curto).
+    """
+    run_ffmpeg(['-ss', f"{seconds:.3f}", '-i', source, '-map', '0:v:0', '-frames:v', '1', '-q:v', '2', output_path])
+    return os.path.exists(output_path) and os.path.getsize(output_path) > 0
@@ -1,61 +1,418 @@
 # function_app/shared_code/processors/pdf_processor.py
+import json
 import logging
 import os
+import shutil
 import tempfile
+import threading
+import time
+import uuid
 import zipfile
+from contextlib import closing
 from io import BytesIO
+from concurrent.futures.process import BrokenProcessPool
 import fitz  # PyMuPDF
-from pypdf import PdfMerger
+from PIL import Image
+from azure.storage.blob import ContentSettings
 
-from .image_processor import shorten_url
+from . import pool
+from .. import staging
+from .common import BlockBlobWriter, blob_urls, parse_params
 
 OUTPUT_CONTAINER = "output-files"
+# 72 DPI é a resolução padrão de get_pixmap(), usada antes de existir o parâmetro.
+DEFAULT_DPI = 72
+MAX_DPI = 600
+IMAGE_FORMATS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp'}
+DEFAULT_QUALITY = 85
+CONTENT_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+# Intervalo mínimo entre escritas de progresso na linha do job.
+PROGRESS_INTERVAL_SECONDS = 1.0
+# Teto de memória da junção de PDFs: PDFs de entrada acima disto são abertos a
+# partir de disco, e o documento de saída é descarregado para disco (e reaberto
+# de lá) sempre que os dados acumulados em memória o ultrapassam.
+MERGE_MEMORY_LIMIT = int(os.environ.get("PDF_MERGE_MEMORY_LIMIT_MB", 256)) * 1024 * 1024
+# Blocos enviados em paralelo no upload do PDF final.
+UPLOAD_CONCURRENCY = 4
+# pdf_optimize: imagens acima de OPTIMIZE_DPI (com esta margem) são reduzidas.
+OPTIMIZE_DPI = 150
+OPTIMIZE_QUALITY = 75
+DOWNSAMPLE_THRESHOLD = 1.2
 
-def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params):
+def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params, progress=None):
     logging.info(f"PROCESSADOR DE PDF: A manusear a operação '{operation}'.")
     if operation == 'pdf_to_images':
-        return convert_pdf_to_images(blob_stream, blob_service_client, original_filename, output_container)
+        return convert_pdf_to_images(blob_stream, blob_service_client, original_filename, output_container, parse_params(params), progress)
     elif operation == 'merge_pdfs':
-        return merge_pdfs_from_zip(blob_stream, blob_service_client, output_container)
+        return merge_pdfs_from_zip(blob_stream, blob_service_client, original_filename, output_container, parse_params(params))
+    elif operation == 'pdf_optimize':
+        return optimize_pdf(blob_stream, blob_service_client, original_filename, output_container, parse_params(params))
     else:
         raise ValueError(f"Operação de PDF desconhecida: {operation}")
 
-def convert_pdf_to_images(blob_stream, blob_service_client, original_filename, output_container):
-    logging.info(f"Convertendo '{original_filename}' para imagens.")
-    pdf_document = fitz.open(stream=blob_stream.read(), filetype="pdf")
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for page_num in range(len(pdf_document)):
-            page = pdf_document.load_page(page_num)
-            pix = page.get_pixmap()
-            img_bytes = pix.tobytes("png")
-            zip_file.writestr(f"pagina_{page_num + 1}.png", img_bytes)
-    zip_buffer.seek(0)
+def parse_page_ranges(spec, page_count):
+    """
+    Converte "1-3,7,10-" (ou uma lista [1, 2, "5-6"]) em índices de página 0-based,
+    pela ordem indicada e sem repetições. Sem 'spec', todas as páginas.
+    """
+    if not spec:
+        return list(range(page_count))
+    parts = spec.split(',') if isinstance(spec, str) else spec
+    pages = []
+    for part in parts:
+        part = str(part).strip()
+        try:
+            if '-' in part:
+                first, last = part.split('-', 1)
+                first, last = int(first or 1), int(last or page_count)
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"Intervalo de páginas inválido: {part}")
+        if first < 1 or last < first:
+            raise ValueError(f"Intervalo de páginas inválido: {part}")
+        pages.extend(range(first - 1, min(last, page_count)))
+    pages = list(dict.fromkeys(pages))
+    if not pages:
+        raise ValueError(f"Nenhuma página do documento ({page_count} páginas) corresponde a '{spec}'.")
+    return pages
+
+def _render_options(params):
+    dpi = int(params.get('dpi', DEFAULT_DPI))
+    if not 1 <= dpi <= MAX_DPI:
+        raise ValueError(f"DPI inválido: {dpi} (entre 1 e {MAX_DPI}).")
+    image_format = str(params.get('format', 'PNG')).upper()
+    if image_format == 'JPG':
+        image_format = 'JPEG'
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Formato de imagem não suportado: {image_format}")
+    return dpi, image_format, int(params.get('quality', DEFAULT_QUALITY))
+
+# Documento aberto em cada processo do pool: as páginas do mesmo job chegam ao
+# mesmo processo muitas vezes seguidas, e abrir o PDF a cada página seria caro.
+# A chave inclui o job (o caminho temporário pode repetir-se entre jobs) e uma
+# thread do processo fecha o documento ao fim de WORKER_DOCUMENT_IDLE_SECONDS sem
+# uso: não se sabe em que processos o job correu, e um documento aberto mantinha
+# ocupado no disco o ficheiro da entrada já apagado.
+WORKER_DOCUMENT_IDLE_SECONDS = 2.0
+_worker_document = None  # [chave, documento, último uso]
+_worker_lock = threading.Lock()
+_worker_reaper = None
+
+def _close_worker_document():
+    global _worker_document
+    if _worker_document is not None:
+        _worker_document[1].close()
+        _worker_document = None
+
+def _reap_worker_document():
+    while True:
+        time.sleep(WORKER_DOCUMENT_IDLE_SECONDS)
+        with _worker_lock:
+            if _worker_document is not None and time.monotonic() - _worker_document[2] >= WORKER_DOCUMENT_IDLE_SECONDS:
+                _close_worker_document()
+
+def render_page(pdf_path, job_key, page_num, dpi, image_format, quality):
+    """Renderiza uma página para bytes no formato pedido (corre num processo do pool)."""
+    global _worker_document, _worker_reaper
+    with _worker_lock:
+        if _worker_reaper is None:
+            _worker_reaper = threading.Thread(target=_reap_worker_document, daemon=True)
+            _worker_reaper.start()
+        if _worker_document is None or _worker_document[0] != (pdf_path, job_key):
+            _close_worker_document()
+            _worker_document = [(pdf_path, job_key), fitz.open(pdf_path), None]
+        pix = _worker_document[1].load_page(page_num).get_pixmap(dpi=dpi)
+        _worker_document[2] = time.monotonic()
+    if image_format == 'PNG':
+        return pix.tobytes("png")
+    return pix.pil_tobytes(format=image_format, quality=quality)
+
+class _PageProgress:
+    """
+    Publica o avanço da renderização na linha do job: 'pagesDone'/'pagesTotal' e,
+    no modo progressivo, o manifesto das páginas já disponíveis ('pagesBaseUrl' +
+    'pageManifest', lista JSON de nomes; as URLs completas ultrapassariam o limite
+    de 32K caracteres de uma propriedade do Table Storage). As escritas são
+    espaçadas de PROGRESS_INTERVAL_SECONDS, exceto a primeira página e a última.
+    """
+
+    def __init__(self, progress, total):
+        self.progress = progress
+        self.total = total
+        self.done = 0
+        self.manifest = []
+        self.base_url = None
+        self._last_report = None
+
+    def page_done(self, page_name=None, page_url=None):
+        self.done += 1
+        if page_name:
+            self.manifest.append(page_name)
+            self.base_url = self.base_url or page_url[:-len(page_name)]
+        now = time.monotonic()
+        if self.progress is None:
+            return
+        if self._last_report is None or self.done == self.total or now - self._last_report >= PROGRESS_INTERVAL_SECONDS:
+            self._last_report = now
+            fields = {'pagesDone': self.done, 'pagesTotal': self.total}
+            if self.manifest:
+                fields.update(pagesBaseUrl=self.base_url, pageManifest=json.dumps(self.manifest))
+            self.progress(**fields)
+
+def convert_pdf_to_images(blob_stream, blob_service_client, original_filename, output_container, params=None, progress=None):
+    """
+    Renderiza as páginas em paralelo no pool de processos. Cada processo abre o
+    documento a partir do mesmo ficheiro temporário e as imagens são escritas, pela
+    ordem das páginas, num ZIP enviado em blocos para o blob enquanto o resto
+    renderiza: em memória ficam só as páginas em curso.
+
+    Com {"progressive": true}, cada página é também publicada assim que fica pronta
+    em '{job_id}/page_{n}.{ext}' e listada na linha do job, antes de o ZIP terminar.
+    """
+    params = params or {}
+    dpi, image_format, quality = _render_options(params)
+    progressive = bool(params.get('progressive', False))
+    logging.info(f"Convertendo '{original_filename}' para imagens ({image_format}, {dpi} DPI).")
+
+    # Os processos do pool abrem o documento pelo caminho: o da entrada preparada
+    # pelo gestor (ver staging), sem outra cópia.
+    pdf_path, pdf_is_copy = staging.local_file(blob_stream, ".pdf")
+
     base_name = os.path.splitext(original_filename)[0]
-    output_blob_name = f"{base_name}_images.zip"
-    output_blob_client = blob_service_client.get_blob_client(container=output_container, blob=output_blob_name)
-    output_blob_client.upload_blob(zip_buffer, overwrite=True)
-    long_url = output_blob_client.url
-    short_url = shorten_url(long_url)
-    return {"outputUrl": long_url, "shortUrl": short_url}
-
-def merge_pdfs_from_zip(blob_stream, blob_service_client, output_container):
+    writer = BlockBlobWriter(f"{base_name}_images.zip", output_container, blob_service_client)
+    extension = IMAGE_FORMATS[image_format]
+    page_settings = ContentSettings(content_type=CONTENT_TYPES[image_format])
+    try:
+        with fitz.open(pdf_path) as pdf_document:
+            pages = parse_page_ranges(params.get('pages'), len(pdf_document))
+        page_progress = _PageProgress(progress, len(pages))
+
+        job_key = uuid.uuid4().hex
+        tasks = ((page_num, render_page, pdf_path, job_key, page_num, dpi, image_format, quality) for page_num in pages)
+        # As imagens já estão comprimidas: ZIP_STORED não volta a gastar CPU com elas.
+        # Se o job falhar a meio, closing() cancela as páginas que ainda não começaram.
+        with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as zip_file, \
+             closing(pool.submit_ordered(tasks)) as rendered:
+            for page_num, future in rendered:
+                image_bytes = future.result()
+                if progressive:
+                    # O nome do blob de entrada é o ID do job (ver main_handler).
+                    page_name = f"page_{page_num + 1}.{extension}"
+                    page_blob = blob_service_client.get_blob_client(container=output_container, blob=f"{base_name}/{page_name}")
+                    page_blob.upload_blob(image_bytes, overwrite=True, content_settings=page_settings)
+                    page_progress.page_done(page_name, page_blob.url)
+                else:
+                    page_progress.page_done()
+                zip_file.writestr(f"pagina_{page_num + 1}.{extension}", image_bytes)
+        writer.close()
+        logging.info(f"{len(pages)} páginas renderizadas.")
+        return writer.urls()
+    except BrokenProcessPool:
+        pool.reset_pool()
+        writer.abort()
+        raise
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        if pdf_is_copy:
+            os.remove(pdf_path)
+
+def _open_member(zip_ref, info, temp_dir):
+    """Abre um PDF do ZIP: em memória se for pequeno, senão a partir de um ficheiro temporário."""
+    if info.file_size <= MERGE_MEMORY_LIMIT:
+        document = fitz.open(stream=zip_ref.read(info), filetype="pdf")
+    else:
+        path = os.path.join(temp_dir, "entrada.pdf")
+        with zip_ref.open(info) as source, open(path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        document = fitz.open(path)
+    if document.needs_pass:
+        document.close()
+        raise ValueError(f"O PDF '{info.filename}' está protegido por palavra-passe.")
+    return document
+
+def merge_pdfs_from_zip(blob_stream, blob_service_client, original_filename, output_container, params=None):
+    """
+    Junta os PDFs do ZIP (por ordem alfabética) com insert_pdf do PyMuPDF, um de
+    cada vez. Quando os dados acumulados passam MERGE_MEMORY_LIMIT, o documento de
+    saída é gravado em disco e reaberto de lá, o que liberta a memória das páginas
+    já copiadas. Com {"dedup": true}, fontes e imagens repetidas entre os PDFs são
+    guardadas uma só vez (garbage=4, mais lento).
+    """
+    params = params or {}
     logging.info(f"Juntando PDFs de um ficheiro ZIP.")
-    merger = PdfMerger()
-    with zipfile.ZipFile(blob_stream, 'r') as zip_ref:
-        pdf_files = sorted([f for f in zip_ref.namelist() if f.lower().endswith('.pdf')])
-        if not pdf_files:
-            raise ValueError("Nenhum ficheiro PDF encontrado no ZIP.")
-        for pdf_file in pdf_files:
-            with zip_ref.open(pdf_file) as pf:
-                merger.append(pf)
-    output_stream = BytesIO()
-    merger.write(output_stream)
-    merger.close()
-    output_stream.seek(0)
-    output_blob_name = "merged_document.pdf"
-    output_blob_client = blob_service_client.get_blob_client(container=output_container, blob=output_blob_name)
-    output_blob_client.upload_blob(output_stream, overwrite=True)
-    long_url = output_blob_client.url
-    short_url = shorten_url(long_url)
-    return {"outputUrl": long_url, "shortUrl": short_url}
+    temp_dir = tempfile.mkdtemp()
+    checkpoints = 0
+    try:
+        with zipfile.ZipFile(blob_stream, 'r') as zip_ref:
+            pdf_files = sorted(
+                (i for i in zip_ref.infolist()
+                 if i.filename.lower().endswith('.pdf') and not i.filename.startswith('__MACOSX/')),
+                key=lambda i: i.filename
+            )
+            if not pdf_files:
+                raise ValueError("Nenhum ficheiro PDF encontrado no ZIP.")
+
+            merged = fitz.open()
+            in_memory = 0
+            for info in pdf_files:
+                with _open_member(zip_ref, info, temp_dir) as source:
+                    merged.insert_pdf(source)
+                in_memory += info.file_size
+                if in_memory > MERGE_MEMORY_LIMIT:
+                    checkpoints += 1
+                    checkpoint_path = os.path.join(temp_dir, f"parcial_{checkpoints}.pdf")
+                    merged.save(checkpoint_path)
+                    merged.close()
+                    merged = fitz.open(checkpoint_path)
+                    in_memory = 0
+                    if checkpoints > 1:
+                        os.remove(os.path.join(temp_dir, f"parcial_{checkpoints - 1}.pdf"))
+
+        output_path = os.path.join(temp_dir, "saida.pdf")
+        merged.save(output_path, garbage=4 if params.get('dedup') else 1, deflate=True)
+        page_count = len(merged)
+        merged.close()
+        logging.info(f"{len(pdf_files)} PDFs juntados ({page_count} páginas, {checkpoints} descargas para disco).")
+
+        # Nome por job: jobs de junção simultâneos já não se sobrescrevem.
+        output_blob_name = f"{os.path.splitext(original_filename)[0]}_merged.pdf"
+        return _upload_pdf(output_path, output_blob_name, output_container, blob_service_client)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _upload_pdf(path, blob_name, container, blob_service_client):
+    """Envia um PDF do disco; o SDK divide-o em blocos e envia-os em paralelo."""
+    output_blob_client = blob_service_client.get_blob_client(container=container, blob=blob_name)
+    with open(path, "rb") as data:
+        output_blob_client.upload_blob(data, overwrite=True, max_concurrency=UPLOAD_CONCURRENCY,
+                                       content_settings=ContentSettings(content_type='application/pdf'))
+    logging.info(f"Ficheiro processado salvo em {container}/{blob_name}")
+    return blob_urls(output_blob_client)
+
+#================================================================================
+# OTIMIZAÇÃO DE PDF
+#================================================================================
+# params = {"dpi": 150, "quality": 75, "linearize": true}
+
+def _is_masked(document, xref, smask):
+    """
+    Indica se a imagem tem transparência ou é ela própria uma máscara: /SMask,
+    /Mask (máscara explícita ou por cor) ou uma máscara stencil (/ImageMask true).
+    """
+    if smask:
+        return True
+    if document.xref_get_key(xref, "ImageMask") == ('bool', 'true'):
+        return True
+    return document.xref_get_key(xref, "Mask")[0] != 'null'
+
+def _image_display_sizes(document):
+    """Maior tamanho (em pontos) com que cada imagem sem máscara é desenhada no documento."""
+    sizes = {}
+    for page in document:
+        for image in page.get_images(full=True):
+            xref, smask = image[0], image[1]
+            if xref in sizes and sizes[xref] is None:
+                continue
+            if _is_masked(document, xref, smask):
+                # Ficam como estão: o JPEG não tem canal alfa e recodificar uma
+                # máscara de 1 bit (ou a imagem que ela recorta) estragava o desenho.
+                sizes[xref] = None
+                continue
+            for rect in page.get_image_rects(xref):
+                width, height = sizes.get(xref) or (0, 0)
+                sizes[xref] = (max(width, rect.width), max(height, rect.height))
+    return {xref: size for xref, size in sizes.items() if size and size[0] > 0 and size[1] > 0}
+
+def _recompress_image(document, xref, display_size, dpi, quality):
+    """
+    Reduz a imagem à resolução pedida (no maior tamanho em que aparece) e volta a
+    codificá-la em JPEG. Só substitui se o resultado for menor que o original.
+    Retorna os bytes poupados.
+    """
+    pix = fitz.Pixmap(document, xref)
+    if pix.alpha or pix.n not in (1, 3, 4):
+        return 0
+    if pix.n == 4:  # CMYK
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    img = Image.frombytes('L' if pix.n == 1 else 'RGB', (pix.width, pix.height), pix.samples)
+
+    width_pt, height_pt = display_size
+    current_dpi = min(pix.width / (width_pt / 72), pix.height / (height_pt / 72))
+    if current_dpi > dpi * DOWNSAMPLE_THRESHOLD:
+        scale = dpi / current_dpi
+        img = img.resize((max(1, round(pix.width * scale)), max(1, round(pix.height * scale))), Image.Resampling.LANCZOS)
+
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=True)
+    original_size = len(document.xref_stream_raw(xref) or b'')
+    if output.tell() >= original_size:
+        return 0
+    # replace_image altera o objeto da imagem, por isso vale para todas as páginas que o usam.
+    document[0].replace_image(xref, stream=output.getvalue())
+    return original_size - output.tell()
+
+def optimize_pdf(blob_stream, blob_service_client, original_filename, output_container, params=None):
+    """
+    Recomprime as imagens embutidas para o DPI/qualidade pedidos, elimina objetos
+    duplicados e recursos sem uso (garbage=4, clean) e, se o MuPDF instalado ainda
+    o suportar, lineariza o resultado para a primeira página abrir logo no navegador.
+    Retorna também o tamanho antes/depois, o tempo gasto e se a linearização foi
+    feita ('linearized'), que o gestor guarda na linha do job.
+    """
+    params = params or {}
+    dpi = int(params.get('dpi', OPTIMIZE_DPI))
+    quality = int(params.get('quality', OPTIMIZE_QUALITY))
+    if not 1 <= dpi <= MAX_DPI:
+        raise ValueError(f"DPI inválido: {dpi} (entre 1 e {MAX_DPI}).")
+    logging.info(f"Otimizando '{original_filename}' ({dpi} DPI, qualidade {quality}).")
+    start = time.perf_counter()
+
+    input_path, input_is_copy = staging.local_file(blob_stream, ".pdf")
+    temp_dir = tempfile.mkdtemp()
+    try:
+        size_before = os.path.getsize(input_path)
+
+        output_path = os.path.join(temp_dir, "saida.pdf")
+        with fitz.open(input_path) as document:
+            if document.needs_pass:
+                raise ValueError("O PDF está protegido por palavra-passe.")
+            recompressed = 0
+            for xref, display_size in _image_display_sizes(document).items():
+                try:
+                    if _recompress_image(document, xref, display_size, dpi, quality):
+                        recompressed += 1
+                except Exception as e:
+                    logging.warning(f"Imagem {xref} mantida sem alterações: {e}")
+
+            save_options = {'garbage': 4, 'deflate': True, 'clean': True}
+            linearized = bool(params.get('linearize', True))
+            if linearized:
+                try:
+                    document.save(output_path, linear=True, **save_options)
+                except Exception as e:
+                    # Versões recentes do MuPDF deixaram de suportar a linearização
+                    # (FzErrorArgument: "Linearisation is no longer supported").
+                    logging.warning(f"Linearização indisponível ({e}); a gravar sem ela.")
+                    linearized = False
+            if not linearized:
+                document.save(output_path, **save_options)
+
+        size_after = os.path.getsize(output_path)
+        elapsed_ms = round((time.perf_counter() - start) * 1000)
+        logging.info(f"PDF otimizado: {size_before} -> {size_after} bytes em {elapsed_ms} ms ({recompressed} imagens recomprimidas).")
+
+        output_blob_name = f"{os.path.splitext(original_filename)[0]}_optimized.pdf"
+        result_data = _upload_pdf(output_path, output_blob_name, output_container, blob_service_client)
+        result_data['stats'] = {
+            'sizeBefore': size_before, 'sizeAfter': size_after,
+            'elapsedMs': elapsed_ms, 'imagesRecompressed': recompressed,
+            'linearized': linearized,
+        }
+        return result_data
+    finally:
+        if input_is_copy:
+            os.remove(input_path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
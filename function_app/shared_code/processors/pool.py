@@ -0,0 +1,63 @@
+# Ficheiro: function_app/shared_code/processors/pool.py
+# Pool de processos partilhado pelos processadores que paralelizam trabalho de
+# CPU (lotes de imagens, páginas de PDF). É criado uma vez por worker do
+# Functions e reutilizado entre invocações, tal como os clientes do Azure.
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Por omissão, um processo por núcleo disponível para este worker.
+_AVAILABLE_CORES = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+POOL_WORKERS = int(os.environ.get("PROCESS_POOL_WORKERS", 0)) or _AVAILABLE_CORES or 1
+# Tarefas em curso por processo: o suficiente para nenhum ficar parado à espera.
+IN_FLIGHT_PER_WORKER = 2
+
+_pool = None
+_lock = threading.Lock()
+
+def get_pool():
+    """Pool de processos do worker (os processos só arrancam uma vez)."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            # 'spawn' em vez de fork: o worker do Functions tem threads (gRPC) que
+            # não sobrevivem a um fork em segurança.
+            _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            logging.info(f"POOL: Pool de {POOL_WORKERS} processos criado.")
+        return _pool
+
+def reset_pool():
+    """Descarta o pool (p. ex. depois de um BrokenProcessPool); o próximo get_pool cria outro."""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def submit_ordered(tasks, window=None):
+    """
+    Submete tarefas ao pool com no máximo 'window' em curso e produz (chave, future)
+    pela ordem de submissão. 'tasks' é um iterável de (chave, função, *args) que só
+    é consumido quando há lugar na janela, por isso os argumentos (p. ex. bytes lidos
+    de um ZIP) também só são produzidos nessa altura.
+
+    Se o consumidor parar antes do fim (erro a meio do job), o close() do gerador
+    cancela as tarefas que ainda não começaram; use-o com contextlib.closing.
+    """
+    pool = get_pool()
+    window = window or POOL_WORKERS * IN_FLIGHT_PER_WORKER
+    pending = deque()
+    try:
+        for key, fn, *args in tasks:
+            if len(pending) >= window:
+                yield pending.popleft()
+            pending.append((key, pool.submit(fn, *args)))
+        while pending:
+            yield pending.popleft()
+    finally:
+        for _, future in pending:
+            future.cancel()
@@ -1,55 +1,341 @@
 # function_app/shared_code/processors/slideshow_creator.py
+#
+# O slideshow não é composto frame a frame: cada imagem é descodificada e
+# ajustada (letterbox) à resolução final uma única vez, num pool de processos, e
+# gravada como um still em disco. O ffmpeg recebe depois uma lista 'concat' com a
+# duração de cada still e codifica um frame por slide (frame rate variável), por
+# isso o tempo de render depende do número de slides e não da duração do vídeo,
+# e a memória depende da janela do pool, não do número de imagens.
+#
+# As transições (fade, crossfade, slide) são feitas pelo filtro xfade do ffmpeg,
+# um par de stills de cada vez: só os frames da transição são calculados e entram
+# na mesma lista, entre os stills. A música opcional do ZIP é juntada na
+# codificação final. Nada passa por callbacks Python frame a frame.
+import io
 import logging
 import os
+import subprocess
 import tempfile
+import time
 import zipfile
-import glob
 import shutil
-from moviepy.editor import ImageClip, concatenate_videoclips
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
-from .image_processor import shorten_url 
+from PIL import Image, ImageOps
+
+from . import media, pool
+from .common import upload_and_get_urls, parse_params
+from .. import time_budget
 
 OUTPUT_CONTAINER = "output-files"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Orientações EXIF que trocam largura e altura (rotações de 90/270 graus).
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+# Qualidade dos stills intermédios (só são lidos pelo ffmpeg, logo a seguir).
+STILL_QUALITY = 95
+# Transição pedida -> transição do filtro xfade do ffmpeg.
+TRANSITIONS = {'fade': 'fadeblack', 'crossfade': 'fade', 'slide': 'slideleft'}
+DEFAULT_TRANSITION_SECONDS = 1.0
+TRANSITION_FPS = 25
+# As transições podem gastar no máximo esta fração do orçamento que resta depois
+# dos stills; as que não couberem passam a corte seco.
+TRANSITION_BUDGET_SHARE = 0.5
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.aac', '.wav', '.ogg', '.flac')
+# A música termina com um fade-out destes segundos no fim do vídeo.
+AUDIO_FADE_SECONDS = 2
+# Intervalo mínimo entre escritas de progresso na linha do job.
+PROGRESS_INTERVAL_SECONDS = 1.0
+# Fatia do progresso (em %) de cada fase do render.
+STAGE_PERCENT = {'stills': (0, 40), 'transitions': (40, 60), 'encoding': (60, 100)}
 
-def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params):
+def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params, progress=None):
     logging.info(f"PROCESSADOR DE SLIDESHOW: A manusear a operação '{operation}'.")
     if operation == 'create_slideshow':
-        duration_per_slide = int(params) if params and params.isdigit() else 3
-        return create_slideshow_from_zip(blob_stream, blob_service_client, output_container, duration_per_slide)
+        # 'params' pode ser só a duração de cada slide ("5") ou um objeto JSON
+        # {"duration": 5, "profile": "fast-preview", "width": 1280, "height": 720,
+        #  "transition": "crossfade", "transition_duration": 1, "audio": "musica.mp3", "budget": 120}.
+        if isinstance(params, str) and params.isdigit():
+            params = {'duration': int(params)}
+        params = parse_params(params)
+        return create_slideshow_from_zip(blob_stream, blob_service_client, original_filename, output_container, params,
+                                         progress)
     else:
         raise ValueError(f"Operação de slideshow desconhecida: {operation}")
 
-def create_slideshow_from_zip(blob_stream, blob_service_client, output_container, duration_per_slide):
-    logging.info(f"Criando slideshow com duração de {duration_per_slide}s por imagem.")
+def _image_members(zip_ref):
+    """Imagens do ZIP, ordenadas pelo nome (a ordem dos slides)."""
+    members = [
+        info for info in zip_ref.infolist()
+        if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+        and not os.path.basename(info.filename).startswith('.')
+        and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    return sorted(members, key=lambda info: info.filename)
+
+def _audio_member(zip_ref, name=None):
+    """Faixa de áudio do ZIP: a indicada em params ou, sem indicação, a primeira pelo nome."""
+    if name:
+        try:
+            return zip_ref.getinfo(name)
+        except KeyError:
+            raise ValueError(f"Ficheiro de áudio '{name}' não encontrado no ZIP.")
+    candidates = sorted(
+        (info for info in zip_ref.infolist()
+         if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+         and not os.path.basename(info.filename).startswith('.')
+         and info.filename.lower().endswith(AUDIO_EXTENSIONS)),
+        key=lambda info: info.filename
+    )
+    return candidates[0] if candidates else None
+
+class _RenderProgress:
+    """
+    Publica o avanço do render na linha do job ('renderStage' e 'renderPercent',
+    de 0 a 100 no conjunto das fases), no máximo a cada PROGRESS_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self._last_report = None
+
+    def report(self, stage, fraction):
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if self._last_report is not None and fraction < 1 and now - self._last_report < PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last_report = now
+        start, end = STAGE_PERCENT[stage]
+        self.progress(renderStage=stage, renderPercent=int(start + (end - start) * min(fraction, 1)))
+
+def _displayed_size(zip_ref, info):
+    """
+    Dimensões da imagem já rodada pela orientação EXIF; só lê o cabeçalho.
+    None se o membro não for uma imagem legível (o slide é ignorado).
+    """
+    try:
+        with zip_ref.open(info) as member, Image.open(member) as img:
+            width, height = img.size
+            if img.getexif().get(0x0112) in _ROTATED_ORIENTATIONS:
+                width, height = height, width
+    except Exception as e:
+        logging.warning(f"PROCESSADOR DE SLIDESHOW: '{info.filename}' ignorado: {e}")
+        return None
+    return width, height
+
+def _frame_size(sizes, params, profile):
+    """
+    Resolução do vídeo: a pedida em params, ou a menor que contém todas as imagens
+    (como fazia a composição do moviepy), reduzida ao máximo do perfil. Sempre par.
+    """
+    if params.get('width') and params.get('height'):
+        width, height = int(params['width']), int(params['height'])
+    else:
+        width, height = max(w for w, _ in sizes), max(h for _, h in sizes)
+        width, height = media.output_size(profile, width, height)
+    return max(2, width // 2 * 2), max(2, height // 2 * 2)
+
+def letterbox_still(data, size, output_path):
+    """
+    Corre num processo do pool: descodifica a imagem (com draft, no JPEG, já perto
+    do tamanho final), aplica a orientação EXIF e centra-a em 'size' com barras
+    pretas, gravando o still em 'output_path'.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', size)
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        still = ImageOps.pad(img, size, method=Image.LANCZOS, color=(0, 0, 0))
+        still.save(output_path, 'JPEG', quality=STILL_QUALITY)
+    return output_path
+
+def _render_transition(first, second, kind, seconds, output_dir):
+    """
+    Frames da transição entre dois stills, calculados pelo filtro xfade do ffmpeg
+    (a TRANSITION_FPS) e gravados como JPEG em 'output_dir'. Retorna os frames, por ordem.
+    """
+    os.makedirs(output_dir)
+    media.run_ffmpeg([
+        '-loop', '1', '-framerate', str(TRANSITION_FPS), '-t', str(seconds), '-i', first,
+        '-loop', '1', '-framerate', str(TRANSITION_FPS), '-t', str(seconds), '-i', second,
+        '-filter_complex', f"[0:v][1:v]xfade=transition={kind}:duration={seconds}:offset=0",
+        '-q:v', '2', os.path.join(output_dir, "frame_%03d.jpg")
+    ])
+    return sorted(os.path.join(output_dir, name) for name in os.listdir(output_dir))
+
+def _render_transitions(stills, kind, seconds, deadline, render_progress):
+    """
+    Renderiza as transições entre stills consecutivos em paralelo (cada uma é um
+    ffmpeg à parte). As que começariam depois de 'deadline' ficam por fazer e
+    esses slides mudam com um corte seco. Retorna {índice do slide: frames}.
+    """
+    def render(index):
+        if deadline is not None and time.monotonic() > deadline:
+            return index, None
+        output_dir = f"{os.path.splitext(stills[index])[0]}_transition"
+        return index, _render_transition(stills[index], stills[index + 1], kind, seconds, output_dir)
+
+    transitions = {}
+    total = len(stills) - 1
+    with ThreadPoolExecutor(max_workers=media.AVAILABLE_CORES or 1) as executor:
+        futures = [executor.submit(render, index) for index in range(total)]
+        for done, future in enumerate(as_completed(futures), start=1):
+            index, frames = future.result()
+            if frames:
+                transitions[index] = frames
+            render_progress.report('transitions', done / total)
+    if len(transitions) < total:
+        logging.warning(f"PROCESSADOR DE SLIDESHOW: {total - len(transitions)} transições sem tempo; a usar cortes secos.")
+    return transitions
+
+def _timeline(stills, duration_per_slide, transitions):
+    """
+    (imagem, duração) de cada frame a codificar. Cada slide ocupa 'duration_per_slide'
+    segundos, incluindo a transição para o seguinte (que vem no fim do seu tempo).
+    """
+    entries = []
+    for index, still in enumerate(stills):
+        frames = transitions.get(index, [])
+        entries.append((still, duration_per_slide - len(frames) / TRANSITION_FPS))
+        entries += [(frame, 1 / TRANSITION_FPS) for frame in frames]
+    return entries
+
+def _concat_list(entries):
+    """
+    Lista do demuxer concat com a duração de cada imagem. 'framerate 1000' dá uma base
+    de tempo de 1 ms às imagens (por omissão é 1/25 s e as durações seriam arredondadas)
+    e a última imagem repete-se sem duração, senão o concat ignora a duração da última.
+    """
+    lines = ["ffconcat version 1.0"]
+    for path, duration in entries:
+        lines += [f"file '{path}'", "option framerate 1000", f"duration {duration:.3f}"]
+    lines += [f"file '{entries[-1][0]}'", "option framerate 1000"]
+    return "\n".join(lines) + "\n"
+
+def create_slideshow_from_zip(blob_stream, blob_service_client, original_filename, output_container, params,
+                              progress=None):
+    duration_per_slide = float(params.get('duration', 3))
+    if duration_per_slide <= 0:
+        raise ValueError(f"Duração por slide inválida: {duration_per_slide}")
+    transition = params.get('transition') or 'none'
+    if transition != 'none' and transition not in TRANSITIONS:
+        raise ValueError(f"Transição desconhecida: {transition} (use none, {', '.join(TRANSITIONS)}).")
+    transition_seconds = float(params.get('transition_duration', DEFAULT_TRANSITION_SECONDS))
+    # A transição não pode ocupar mais de metade do tempo de um slide.
+    transition_seconds = min(transition_seconds, duration_per_slide / 2)
+    logging.info(f"Criando slideshow com duração de {duration_per_slide}s por imagem (transição: {transition}).")
+
+    # Orçamento de render: o pedido em params, limitado pelo tempo que resta à invocação.
+    limits = [limit for limit in (params.get('budget'), time_budget.remaining()) if limit is not None]
+    budget = min(float(limit) for limit in limits) if limits else None
+    deadline = time.monotonic() + budget if budget is not None else None
+    render_progress = _RenderProgress(progress)
+
     temp_dir = tempfile.mkdtemp()
-    output_path = tempfile.mktemp(suffix=".mp4")
+    output_path = os.path.join(temp_dir, "slideshow.mp4")
+    audio_path = None
     try:
+        # O blob de entrada já chega como um ficheiro seekable (ver staging).
         with zipfile.ZipFile(blob_stream, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-        
-        image_files = sorted(
-            glob.glob(os.path.join(temp_dir, '*.jpg')) +
-            glob.glob(os.path.join(temp_dir, '*.jpeg')) +
-            glob.glob(os.path.join(temp_dir, '*.png'))
-        )
-        if not image_files:
-            raise ValueError("Nenhum ficheiro de imagem (.jpg, .png) encontrado no ZIP.")
-            
-        logging.info(f"Encontradas {len(image_files)} imagens para o slideshow.")
-
-        clips = [ImageClip(m).set_duration(duration_per_slide) for m in image_files]
-        final_clip = concatenate_videoclips(clips, method="compose")
-        final_clip.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac')
-        
-        output_blob_name = "slideshow_final.mp4"
-        output_blob_client = blob_service_client.get_blob_client(container=output_container, blob=output_blob_name)
-        with open(output_path, "rb") as data:
-            output_blob_client.upload_blob(data, overwrite=True)
+            members = _image_members(zip_ref)
+            # Primeira passagem só pelos cabeçalhos: dimensões e imagens ilegíveis.
+            sizes = {info.filename: _displayed_size(zip_ref, info) for info in members}
+            slides = [info for info in members if sizes[info.filename]]
+            if not slides:
+                raise ValueError("Nenhum ficheiro de imagem (.jpg, .png) encontrado no ZIP.")
+            logging.info(f"Encontradas {len(slides)} imagens para o slideshow.")
+
+            audio_info = _audio_member(zip_ref, params.get('audio'))
+            if audio_info:
+                audio_path = os.path.join(temp_dir, f"audio{os.path.splitext(audio_info.filename)[1]}")
+                with zip_ref.open(audio_info) as source, open(audio_path, "wb") as target:
+                    shutil.copyfileobj(source, target)
 
-        long_url = output_blob_client.url
-        short_url = shorten_url(long_url)
-        return {"outputUrl": long_url, "shortUrl": short_url}
+            # Perfil de codificação, com descida automática se não couber no orçamento.
+            # Só se codificam os stills e os frames das transições: a estimativa conta-os
+            # como frames a 30 fps.
+            frame_count = len(slides)
+            if transition != 'none':
+                frame_count += (len(slides) - 1) * round(transition_seconds * TRANSITION_FPS)
+            requested = params.get('profile') or media.DEFAULT_PROFILE
+            valid_sizes = [sizes[info.filename] for info in slides]
+            frame_size = _frame_size(valid_sizes, params, requested)
+            profile, downgraded_from = media.choose_profile(requested, frame_count / 30, *frame_size, budget)
+            if profile != requested and not (params.get('width') and params.get('height')):
+                frame_size = _frame_size(valid_sizes, params, profile)
+            logging.info(f"Slideshow {frame_size[0]}x{frame_size[1]} com o perfil '{profile}'.")
+
+            # Cada imagem só é lida do ZIP quando há lugar na janela do pool.
+            tasks = (
+                (info, letterbox_still, zip_ref.read(info), frame_size, os.path.join(temp_dir, f"still_{index:05d}.jpg"))
+                for index, info in enumerate(slides)
+            )
+            stills = []
+            try:
+                with closing(pool.submit_ordered(tasks)) as results:
+                    for done, (info, future) in enumerate(results, start=1):
+                        try:
+                            stills.append(future.result())
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            logging.warning(f"PROCESSADOR DE SLIDESHOW: '{info.filename}' ignorado: {e}")
+                        render_progress.report('stills', done / len(slides))
+            except BrokenProcessPool:
+                pool.reset_pool()
+                raise
+        if not stills:
+            raise ValueError("Nenhuma imagem válida (.jpg, .png) encontrada no ZIP.")
+
+        transitions = {}
+        if transition != 'none' and len(stills) > 1 and transition_seconds > 0:
+            transitions_deadline = None
+            if deadline is not None:
+                transitions_deadline = time.monotonic() + (deadline - time.monotonic()) * TRANSITION_BUDGET_SHARE
+            transitions = _render_transitions(stills, TRANSITIONS[transition], transition_seconds,
+                                              transitions_deadline, render_progress)
+
+        entries = _timeline(stills, duration_per_slide, transitions)
+        total_seconds = duration_per_slide * len(stills)
+        list_path = os.path.join(temp_dir, "slides.txt")
+        with open(list_path, "w") as f:
+            f.write(_concat_list(entries))
+
+        settings = media.ENCODING_PROFILES[profile]
+        args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            fade_start = max(0.0, total_seconds - AUDIO_FADE_SECONDS)
+            args += ['-i', audio_path, '-map', '0:v', '-map', '1:a',
+                     '-af', f"afade=t=out:st={fade_start:.3f}:d={AUDIO_FADE_SECONDS}",
+                     *media.audio_encoder_args(profile), '-t', f"{total_seconds:.3f}"]
+        args += [
+            # Um frame por imagem da lista: sem duplicar frames para um frame rate constante.
+            '-fps_mode', 'passthrough',
+            '-c:v', 'libx264', '-preset', settings['preset'], '-crf', str(settings['crf']),
+            '-tune', 'stillimage', '-bf', '0', '-pix_fmt', 'yuv420p',
+            '-movflags', '+faststart', output_path
+        ]
+        timeout = max(1.0, deadline - time.monotonic()) if deadline is not None else None
+        try:
+            media.run_ffmpeg(args, timeout=timeout,
+                             on_progress=lambda seconds: render_progress.report('encoding', seconds / total_seconds))
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"O render do slideshow excedeu o orçamento de {budget:.0f}s.")
+        render_progress.report('encoding', 1)
+
+        output_blob_name = f"{os.path.splitext(original_filename)[0]}_slideshow.mp4"
+        with open(output_path, "rb") as data:
+            result_data = upload_and_get_urls(data, output_blob_name, output_container, blob_service_client)
+        result_data['stats'] = {
+            'slides': len(stills), 'skipped': len(members) - len(stills), 'profile': profile,
+            'transition': transition, 'transitions': len(transitions), 'audio': bool(audio_path),
+        }
+        if transition != 'none':
+            result_data['stats']['transitionsSkipped'] = len(stills) - 1 - len(transitions)
+        if downgraded_from:
+            result_data['stats']['profileRequested'] = downgraded_from
+        return result_data
 
     finally:
-        if os.path.exists(temp_dir): shutil.rmtree(temp_dir)
-        if os.path.exists(output_path): os.remove(output_path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
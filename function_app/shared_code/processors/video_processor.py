@@ -1,79 +1,315 @@
 # function_app/shared_code/processors/video_processor.py
 import logging
-from moviepy.editor import VideoFileClip
 import os
 import tempfile
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Importa a função utilitária do módulo de imagem para evitar duplicação
-from .image_processor import shorten_url 
+from azure.storage.blob import ContentSettings
 
+from .common import upload_and_get_urls, parse_params, read_url, blob_urls
+from . import media
+from .. import staging, time_budget
+
+INPUT_CONTAINER = "input-files"
 OUTPUT_CONTAINER = "output-files"
+# Streams que o MP4 (e os navegadores) aceitam tal como estão: são copiados sem recodificar.
+MP4_VIDEO_CODECS = ('h264',)
+MP4_PIXEL_FORMATS = ('yuv420p', 'yuvj420p')
+MP4_AUDIO_CODECS = ('aac',)
+# Modo paralelo: segmentos mais curtos que isto não compensam o arranque de um encoder.
+MIN_SEGMENT_SECONDS = 10
+MAX_PARALLEL_WORKERS = 16
+# video_sprites: um frame a cada SPRITE_INTERVAL s, com SPRITE_WIDTH px de largura,
+# em folhas de SPRITE_COLUMNS x SPRITE_ROWS miniaturas.
+SPRITE_INTERVAL = 10
+SPRITE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+SPRITE_UPLOAD_CONCURRENCY = 8
 
-def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params):
+def handle(operation, blob_stream, blob_service_client, original_filename, output_container, params, progress=None):
     """Função "gestora" que direciona para o processamento de vídeo correto."""
     logging.info(f"PROCESSADOR DE VÍDEO: A manusear a operação '{operation}'.")
     if operation == 'video_to_mp4':
-        return convert_to_mp4(blob_stream, blob_service_client, original_filename, output_container)
+        return convert_to_mp4(blob_stream, blob_service_client, original_filename, output_container, parse_params(params))
     elif operation == 'generate_thumbnail':
-        return generate_thumbnail(blob_stream, blob_service_client, original_filename, output_container)
+        return generate_thumbnail(blob_stream, blob_service_client, original_filename, output_container, parse_params(params))
+    elif operation == 'video_sprites':
+        return generate_sprites(blob_stream, blob_service_client, original_filename, output_container, parse_params(params))
     else:
         raise ValueError(f"Operação de vídeo desconhecida: {operation}")
 
-def convert_to_mp4(blob_stream, blob_service_client, original_filename, output_container):
-    """Converte um vídeo para o formato MP4."""
-    logging.info(f"Convertendo '{original_filename}' para MP4.")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(original_filename)[1]) as temp_input_file:
-        temp_input_file.write(blob_stream.read())
-        input_path = temp_input_file.name
+def _plan_conversion(info, max_height=None):
+    """
+    Decide, stream a stream, o que pode ser copiado e o que tem de ser recodificado.
+    Com 'max_height' (perfil pedido explicitamente), vídeo mais alto é recodificado.
+    """
+    video, audio = info['video'], info['audio']
+    if video is None:
+        raise ValueError("O ficheiro de entrada não tem nenhum stream de vídeo.")
+    copy_video = video['codec'] in MP4_VIDEO_CODECS and video['pix_fmt'] in MP4_PIXEL_FORMATS
+    if max_height and video['height'] and video['height'] > max_height:
+        copy_video = False
+    copy_audio = audio is None or audio['codec'] in MP4_AUDIO_CODECS
+    if copy_video and copy_audio:
+        path = 'remux'
+    elif copy_video:
+        path = 'transcode_audio'
+    elif copy_audio:
+        path = 'transcode_video'
+    else:
+        path = 'transcode'
+    return path, copy_video, copy_audio
+
+def _conversion_args(input_path, output_path, info, copy_video, copy_audio, profile, capped=True):
+    video = info['video']
+    args = ['-i', input_path, '-map', f"0:{video['index']}"]
+    if info['audio'] is not None:
+        args += ['-map', f"0:{info['audio']['index']}"]
+    if copy_video:
+        args += ['-c:v', 'copy']
+    else:
+        args += media.video_encoder_args(profile, video['width'], video['height'], capped=capped)
+    if info['audio'] is not None:
+        args += ['-c:a', 'copy'] if copy_audio else media.audio_encoder_args(profile)
+    # faststart: o índice (moov) vai para o início e o vídeo começa a tocar antes de descarregar tudo.
+    return args + ['-movflags', '+faststart', output_path]
+
+def _parallel_workers(params, info):
+    """Número de segmentos a codificar em paralelo ({"workers": N ou "auto"}); 1 = caminho normal."""
+    workers = params.get('workers', 1)
+    if workers == 'auto':
+        workers = media.AVAILABLE_CORES or 1
+    workers = max(1, min(int(workers), MAX_PARALLEL_WORKERS))
+    # Sem segmentos de pelo menos MIN_SEGMENT_SECONDS, usa-se menos workers.
+    return max(1, min(workers, int((info['duration'] or 0) // MIN_SEGMENT_SECONDS)))
+
+def _transcode_segments(input_path, output_path, info, copy_audio, profile, workers, temp_dir, capped=True):
+    """
+    Codificação paralela por segmentos: o vídeo é cortado nos keyframes (cópia, sem
+    descodificar) em cerca de 'workers' segmentos, cada segmento é codificado por
+    um processo ffmpeg próprio e os resultados são concatenados sem recodificar.
+    O áudio é tratado de uma vez, na concatenação. Retorna o número de segmentos.
+    """
+    video = info['video']
+    segment_seconds = info['duration'] / workers
+    media.run_ffmpeg([
+        '-i', input_path, '-map', f"0:{video['index']}", '-c', 'copy',
+        '-f', 'segment', '-segment_time', f"{segment_seconds:.3f}", '-reset_timestamps', '1',
+        os.path.join(temp_dir, 'origem_%04d.mkv')
+    ])
+    sources = sorted(os.path.join(temp_dir, name) for name in os.listdir(temp_dir) if name.startswith('origem_'))
+    encoded = [source.replace('origem_', 'codificado_') for source in sources]
+
+    # Cada ffmpeg já é um processo; as threads só esperam por eles. Os núcleos são
+    # repartidos entre os encoders em vez de cada um tentar usar todos.
+    threads = max(1, (media.AVAILABLE_CORES or 1) // len(sources))
+    encoder_args = media.video_encoder_args(profile, video['width'], video['height'], threads=threads, capped=capped)
+    if video['fps']:
+        # Cada segmento começa em 0 (reset_timestamps): com frame rate constante à
+        # taxa da origem, a concatenação fica com os mesmos frames e a mesma
+        # duração que a codificação num só ffmpeg (sem buracos nas junções).
+        encoder_args += ['-r', media.frame_rate(video['fps']), '-fps_mode', 'cfr']
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda src, dst: media.run_ffmpeg(['-i', src, *encoder_args, '-an', dst]), sources, encoded))
 
+    list_path = os.path.join(temp_dir, 'segmentos.txt')
+    with open(list_path, 'w') as list_file:
+        list_file.writelines(f"file '{path}'\n" for path in encoded)
+    args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+    if info['audio'] is not None:
+        args += ['-i', input_path, '-map', '0:v:0', '-map', f"1:{info['audio']['index']}", '-c:v', 'copy']
+        args += ['-c:a', 'copy'] if copy_audio else media.audio_encoder_args(profile)
+    else:
+        args += ['-c', 'copy']
+    media.run_ffmpeg(args + ['-movflags', '+faststart', output_path])
+    return len(sources)
+
+def convert_to_mp4(blob_stream, blob_service_client, original_filename, output_container, params=None):
+    """
+    Converte um vídeo para o formato MP4. Os streams já em H.264/AAC são copiados
+    (remux, segundos em vez de minutos) e só os incompatíveis são recodificados,
+    com o perfil de codificação de {"profile": ...} (ver media.ENCODING_PROFILES).
+    Se a codificação estimada não couber no tempo que resta, o perfil desce para
+    um mais rápido. Com {"workers": N} (ou "auto"), o vídeo é codificado em N
+    segmentos em paralelo. O caminho seguido e o tempo gasto vão para a linha do job ('stats').
+    """
+    params = params or {}
+    requested_profile = params.get('profile')
+    logging.info(f"Convertendo '{original_filename}' para MP4.")
+    start = time.perf_counter()
+    input_path, input_is_copy = staging.local_file(blob_stream, os.path.splitext(original_filename)[1])
     output_path = tempfile.mktemp(suffix=".mp4")
+    temp_dir = tempfile.mkdtemp()
 
     try:
-        clip = VideoFileClip(input_path)
-        clip.write_videofile(output_path, codec='libx264', audio_codec='aac')
-        
+        info = media.probe(input_path)
+        max_height = media.ENCODING_PROFILES[requested_profile]['max_height'] if requested_profile in media.ENCODING_PROFILES else None
+        path, copy_video, copy_audio = _plan_conversion(info, max_height)
+        profile, downgraded_from = media.choose_profile(
+            requested_profile, info['duration'], info['video']['width'], info['video']['height'],
+            time_budget.remaining() if not copy_video else None, capped=requested_profile is not None
+        )
+        # Sem perfil pedido mantém-se a resolução (como no remux), a não ser que
+        # o tempo tenha obrigado a descer para um perfil mais rápido.
+        capped = requested_profile is not None or downgraded_from is not None
+        workers = 1 if copy_video else _parallel_workers(params, info)
+        logging.info(f"Conversão por '{path}' com o perfil '{profile}' (vídeo {info['video']['codec']}, áudio {(info['audio'] or {}).get('codec')}, {workers} workers).")
+        segments = None
+        if workers > 1:
+            segments = _transcode_segments(input_path, output_path, info, copy_audio, profile, workers, temp_dir, capped)
+        else:
+            media.run_ffmpeg(_conversion_args(input_path, output_path, info, copy_video, copy_audio, profile, capped))
+
         base_name = os.path.splitext(original_filename)[0]
         output_blob_name = f"{base_name}_converted.mp4"
 
-        output_blob_client = blob_service_client.get_blob_client(container=output_container, blob=output_blob_name)
         with open(output_path, "rb") as data:
-            output_blob_client.upload_blob(data, overwrite=True)
-            
-        long_url = output_blob_client.url
-        short_url = shorten_url(long_url)
-        return {"outputUrl": long_url, "shortUrl": short_url}
+            result_data = upload_and_get_urls(data, output_blob_name, output_container, blob_service_client)
+        result_data['stats'] = {
+            'path': path, 'elapsedMs': round((time.perf_counter() - start) * 1000),
+            'videoCodec': info['video']['codec'], 'audioCodec': (info['audio'] or {}).get('codec'),
+            'duration': info['duration'], 'profile': profile,
+        }
+        if downgraded_from:
+            result_data['stats']['profileRequested'] = downgraded_from
+        if segments:
+            result_data['stats']['segments'] = segments
+        return result_data
 
     finally:
-        if os.path.exists(input_path): os.remove(input_path)
+        if input_is_copy and os.path.exists(input_path): os.remove(input_path)
         if os.path.exists(output_path): os.remove(output_path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-def generate_thumbnail(blob_stream, blob_service_client, original_filename, output_container):
-    """Extrai um único frame (thumbnail) de um vídeo."""
-    logging.info(f"Gerando thumbnail para '{original_filename}'.")
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(original_filename)[1]) as temp_input_file:
-        temp_input_file.write(blob_stream.read())
-        input_path = temp_input_file.name
+def generate_thumbnail(blob_stream, blob_service_client, original_filename, output_container, params=None):
+    """
+    Extrai um único frame (thumbnail) de um vídeo, no segundo 2 por omissão
+    ({"time": s} para outro instante). O ffmpeg lê o blob de entrada por URL, com
+    pedidos por intervalos: só o cabeçalho/índice e o GOP do instante pedido, sem
+    descarregar o vídeo (o gestor não prepara a entrada desta operação). Sem URL de
+    leitura, usa uma cópia local: do stream recebido ou, sem ele, do blob.
+    """
+    params = params or {}
+    seconds = float(params.get('time', 2.0))
+    logging.info(f"Gerando thumbnail para '{original_filename}' ({seconds}s).")
 
     output_path = tempfile.mktemp(suffix=".jpg")
-    
+    input_path, input_is_copy = None, False
+    staged = None
+
     try:
-        clip = VideoFileClip(input_path)
-        clip.save_frame(output_path, t=2.00) # Salva o frame do segundo 2
+        source = read_url(blob_service_client, INPUT_CONTAINER, original_filename)
+        try:
+            if source is None:
+                raise RuntimeError("sem URL de leitura para o blob de entrada")
+            found = media.extract_frame(source, output_path, seconds)
+        except RuntimeError as e:
+            logging.warning(f"Leitura por intervalos indisponível ({e}); a usar a cópia local.")
+            if blob_stream is None:
+                input_blob_client = blob_service_client.get_blob_client(container=INPUT_CONTAINER, blob=original_filename)
+                blob_stream = staged = staging.stage_blob(input_blob_client, original_filename)
+            input_path, input_is_copy = staging.local_file(blob_stream, os.path.splitext(original_filename)[1])
+            source = input_path
+            found = media.extract_frame(source, output_path, seconds)
+        if not found and not media.extract_frame(source, output_path, 0):
+            # (Vídeo mais curto que o instante pedido: tenta o primeiro frame.)
+            raise ValueError("Não foi possível extrair nenhum frame do vídeo.")
         
         base_name = os.path.splitext(original_filename)[0]
         output_blob_name = f"thumb_{base_name}.jpg"
 
-        output_blob_client = blob_service_client.get_blob_client(container=output_container, blob=output_blob_name)
         with open(output_path, "rb") as data:
-            output_blob_client.upload_blob(data, overwrite=True)
-
-        long_url = output_blob_client.url
-        short_url = shorten_url(long_url)
-        return {"outputUrl": long_url, "shortUrl": short_url}
+            return upload_and_get_urls(data, output_blob_name, output_container, blob_service_client)
 
     finally:
-        if os.path.exists(input_path): os.remove(input_path)
+        if input_is_copy and os.path.exists(input_path): os.remove(input_path)
+        if staged is not None: staged.close()
         if os.path.exists(output_path): os.remove(output_path)
+
+#================================================================================
+# FOLHAS DE MINIATURAS (SPRITES) + ÍNDICE WEBVTT
+#================================================================================
+# params = {"interval": 10, "width": 160, "columns": 10, "rows": 10}
+
+def _vtt_timestamp(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+def _sprites_vtt(count, duration, interval, thumb_size, columns, rows):
+    """Índice WebVTT: cada intervalo aponta para a sua miniatura dentro da folha (#xywh)."""
+    width, height = thumb_size
+    per_sheet = columns * rows
+    lines = ["WEBVTT", ""]
+    for index in range(count):
+        start, end = index * interval, min((index + 1) * interval, duration)
+        sheet, position = divmod(index, per_sheet)
+        row, column = divmod(position, columns)
+        lines += [
+            f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}",
+            f"sprite_{sheet + 1:03d}.jpg#xywh={column * width},{row * height},{width},{height}",
+            "",
+        ]
+    return "\n".join(lines)
+
+def generate_sprites(blob_stream, blob_service_client, original_filename, output_container, params=None):
+    """
+    Gera as miniaturas de pré-visualização numa só passagem sequencial do ffmpeg:
+    fps (um frame por intervalo) -> scale (logo a seguir à descodificação, para só
+    circularem imagens pequenas) -> tile (monta as folhas). As folhas e o índice
+    WebVTT são enviados juntos para '{job_id}_sprites/'; o índice vai por último,
+    para que, quando existe, todas as folhas a que se refere já existam.
+    """
+    params = params or {}
+    interval = float(params.get('interval', SPRITE_INTERVAL))
+    thumb_width = int(params.get('width', SPRITE_WIDTH)) // 2 * 2
+    columns = int(params.get('columns', SPRITE_COLUMNS))
+    rows = int(params.get('rows', SPRITE_ROWS))
+    if interval <= 0 or thumb_width < 2 or columns < 1 or rows < 1:
+        raise ValueError(f"Parâmetros de sprites inválidos: {params}")
+    logging.info(f"Gerando sprites para '{original_filename}' (um frame a cada {interval}s).")
+
+    input_path, input_is_copy = staging.local_file(blob_stream, os.path.splitext(original_filename)[1])
+    temp_dir = tempfile.mkdtemp()
+    try:
+        info = media.probe(input_path)
+        video = info['video']
+        if video is None or not info['duration'] or not video['width']:
+            raise ValueError("O ficheiro de entrada não tem um stream de vídeo com duração e dimensões conhecidas.")
+        thumb_height = max(2, round(thumb_width * video['height'] / video['width'] / 2) * 2)
+
+        media.run_ffmpeg([
+            '-i', input_path, '-map', f"0:{video['index']}", '-an',
+            '-vf', f"fps=1/{interval},scale={thumb_width}:{thumb_height}:flags=area,tile={columns}x{rows}",
+            '-q:v', '3', os.path.join(temp_dir, 'sprite_%03d.jpg')
+        ])
+        sprites = sorted(name for name in os.listdir(temp_dir) if name.startswith('sprite_'))
+        if not sprites:
+            raise ValueError("Não foi possível extrair nenhum frame do vídeo.")
+        count = min(-(-int(info['duration'] * 1000) // int(interval * 1000)), len(sprites) * columns * rows)
+        vtt = _sprites_vtt(count, info['duration'], interval, (thumb_width, thumb_height), columns, rows)
+
+        prefix = f"{os.path.splitext(original_filename)[0]}_sprites"
+        jpeg_settings = ContentSettings(content_type='image/jpeg')
+
+        def upload_sprite(name):
+            blob_client = blob_service_client.get_blob_client(container=output_container, blob=f"{prefix}/{name}")
+            with open(os.path.join(temp_dir, name), "rb") as data:
+                blob_client.upload_blob(data, overwrite=True, content_settings=jpeg_settings)
+
+        with ThreadPoolExecutor(max_workers=SPRITE_UPLOAD_CONCURRENCY) as executor:
+            list(executor.map(upload_sprite, sprites))
+        vtt_client = blob_service_client.get_blob_client(container=output_container, blob=f"{prefix}/thumbnails.vtt")
+        vtt_client.upload_blob(vtt.encode('utf-8'), overwrite=True, content_settings=ContentSettings(content_type='text/vtt'))
+        logging.info(f"{count} miniaturas em {len(sprites)} folhas salvas em {output_container}/{prefix}/")
+
+        result_data = blob_urls(vtt_client)
+        result_data['stats'] = {'thumbnails': count, 'sprites': len(sprites)}
+        return result_data
+
+    finally:
+        if input_is_copy and os.path.exists(input_path): os.remove(input_path)
+        shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,155 @@
+# Ficheiro: function_app/shared_code/result_cache.py
+# Cache de resultados endereçada por conteúdo: o mesmo ficheiro de entrada com a
+# mesma operação e os mesmos parâmetros reutiliza o blob de saída já existente.
+
+import hashlib
+import logging
+import os
+from datetime import datetime
+
+from azure.storage.blob import BlobClient
+
+from . import clients, staging
+
+# --- Constantes da Cache ---
+RESULT_CACHE_TABLE = "resultcache"
+RESULT_CACHE_PARTITION = "results"
+# Orçamento total (soma dos tamanhos das saídas indexadas); acima dele, sai o menos usado.
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+# A limpeza percorre o índice inteiro, por isso só corre a cada N inserções.
+EVICTION_EVERY = 50
+# Operações com nome de saída fixo: um resultado posterior sobrescreve o blob.
+NON_CACHEABLE_OPERATIONS = set()
+# Métricas que marcam um resultado degradado por falta de tempo na invocação (um
+# perfil de codificação mais rápido que o pedido, transições de slideshow trocadas
+# por cortes secos). Esses resultados não entram na cache: a chave só tem entrada +
+# operação + parâmetros, e um pedido idêntico com tempo suficiente receberia para
+# sempre a versão degradada.
+DEGRADED_STATS = ('profileRequested', 'transitionsSkipped')
+
+_table_ready = False
+_stores_since_eviction = 0
+
+def get_table_client(connection_string=None):
+    """Devolve o cliente da tabela do índice, criando-a na primeira utilização do processo."""
+    global _table_ready
+    if not _table_ready:
+        clients.get_table_service_client(connection_string).create_table_if_not_exists(table_name=RESULT_CACHE_TABLE)
+        _table_ready = True
+    return clients.get_table_client(RESULT_CACHE_TABLE, connection_string)
+
+def hash_and_spool(stream):
+    """
+    Devolve (digest SHA-256, entrada seekable posicionada no início). Uma entrada
+    já preparada (staging.StagedInput) calculou o digest ao ser copiada e é usada
+    tal como está; qualquer outro stream é copiado para uma agora.
+    """
+    if not isinstance(stream, staging.StagedInput):
+        stream = staging.stage_stream(stream)
+    return stream.hexdigest(), stream
+
+def is_degraded(result_data):
+    stats = result_data.get('stats') or {}
+    return any(stats.get(name) for name in DEGRADED_STATS)
+
+def cache_key(input_digest, operation, params):
+    return hashlib.sha256(f"{input_digest}\n{operation}\n{params or ''}".encode()).hexdigest()
+
+def lookup(table_client, blob_service_client, key):
+    """
+    Devolve o resultado em cache ({'outputUrl': ...}) ou None. A URL curta não é
+    guardada: o gestor regista-a (de forma idempotente) em cada job.
+    """
+    try:
+        entity = table_client.get_entity(partition_key=RESULT_CACHE_PARTITION, row_key=key)
+    except Exception:
+        return None
+
+    try:
+        output_blob_client = blob_service_client.get_blob_client(container=entity['container'], blob=entity['blobName'])
+        if not output_blob_client.exists():
+            # A saída foi apagada entretanto; a entrada do índice já não serve.
+            table_client.delete_entity(partition_key=RESULT_CACHE_PARTITION, row_key=key)
+            return None
+        table_client.update_entity(entity={
+            'PartitionKey': RESULT_CACHE_PARTITION, 'RowKey': key,
+            'lastUsed': datetime.utcnow().isoformat()
+        })
+    except Exception as e:
+        logging.warning(f"CACHE: Não foi possível validar a entrada {key}: {e}")
+        return None
+
+    return {'outputUrl': entity['outputUrl']}
+
+def store(table_client, blob_service_client, key, operation, result_data):
+    """Indexa a saída de um job processado. Falhas aqui nunca fazem falhar o job."""
+    global _stores_since_eviction
+    try:
+        output_blob_client = BlobClient.from_blob_url(
+            result_data['outputUrl'], credential=blob_service_client.credential, transport=clients.get_transport()
+        )
+        size = output_blob_client.get_blob_properties().size
+        entity = {
+            'PartitionKey': RESULT_CACHE_PARTITION, 'RowKey': key,
+            'operation': operation,
+            'container': output_blob_client.container_name,
+            'blobName': output_blob_client.blob_name,
+            'outputUrl': result_data['outputUrl'],
+            'size': size,
+            'lastUsed': datetime.utcnow().isoformat()
+        }
+        table_client.upsert_entity(entity=entity)
+
+        _stores_since_eviction += 1
+        if _stores_since_eviction >= EVICTION_EVERY:
+            _stores_since_eviction = 0
+            evict(table_client)
+    except Exception as e:
+        logging.warning(f"CACHE: Não foi possível indexar o resultado {key}: {e}")
+
+def evict(table_client, max_bytes=RESULT_CACHE_MAX_BYTES):
+    """Remove as entradas menos usadas até o total indexado caber no orçamento."""
+    entries = list(table_client.query_entities(
+        query_filter="PartitionKey eq @pk",
+        parameters={'pk': RESULT_CACHE_PARTITION},
+        select=['RowKey', 'size', 'lastUsed']
+    ))
+    total = sum(entry.get('size') or 0 for entry in entries)
+    if total <= max_bytes:
+        return 0
+
+    removed = 0
+    for entry in sorted(entries, key=lambda e: e.get('lastUsed') or ''):
+        if total <= max_bytes:
+            break
+        table_client.delete_entity(partition_key=RESULT_CACHE_PARTITION, row_key=entry['RowKey'])
+        total -= entry.get('size') or 0
+        removed += 1
+    logging.info(f"CACHE: {removed} entradas removidas; {total} bytes indexados.")
+    return removed
+
+def run_cached(table_client, blob_service_client, blob_stream, operation, params, process):
+    """
+    Executa 'process(stream)' a não ser que já exista um resultado para a mesma
+    entrada + operação + parâmetros. Devolve (result_data, cache_hit).
+    """
+    input_digest, input_stream = hash_and_spool(blob_stream)
+    try:
+        if table_client is None or operation in NON_CACHEABLE_OPERATIONS:
+            return process(input_stream), False
+
+        key = cache_key(input_digest, operation, params)
+        cached = lookup(table_client, blob_service_client, key)
+        if cached:
+            logging.info(f"CACHE: Resultado reutilizado para '{operation}' (chave {key[:12]}).")
+            return cached, True
+
+        result_data = process(input_stream)
+        if result_data and 'outputUrl' in result_data:
+            if is_degraded(result_data):
+                logging.info(f"CACHE: Resultado degradado de '{operation}' não guardado (chave {key[:12]}).")
+            else:
+                store(table_client, blob_service_client, key, operation, result_data)
+        return result_data, False
+    finally:
+        input_stream.close()
@@ -0,0 +1,84 @@
+# Ficheiro: function_app/shared_code/shortlinks.py
+# Serviço de links curtos próprio. O código é gerado localmente a partir da URL
+# (sem chamadas externas) e o mapeamento código -> URL fica numa tabela, lida
+# pelo web app que serve os redirecionamentos em /s/<código>.
+
+import hashlib
+import logging
+import os
+
+from azure.core.exceptions import ResourceExistsError
+
+from . import clients
+
+SHORTLINKS_TABLE = "shortlinks"
+SHORTLINKS_PARTITION = "links"
+# URL pública do web app, ex.: https://<nome>.azurewebsites.net (sem ela, não há URL curta).
+SHORTLINK_BASE_URL = os.environ.get("SHORTLINK_BASE_URL", "")
+# 8 caracteres base62 ~ 47 bits: colisões são improváveis para o volume deste serviço.
+CODE_LENGTH = 8
+# Se o código já pertencer a outra URL, usa-se um mais longo (o web app aceita até 16).
+MAX_CODE_LENGTH = 16
+_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+_table_ready = False
+
+def make_code(long_url, length=CODE_LENGTH):
+    """
+    Código curto determinístico: a mesma URL gera sempre o mesmo código. Os códigos
+    mais longos (só usados em colisões) tiram os dígitos do hash inteiro.
+    """
+    digest = hashlib.sha256(long_url.encode()).digest()
+    number = int.from_bytes(digest[:8] if length <= CODE_LENGTH else digest, "big")
+    code = []
+    for _ in range(length):
+        number, remainder = divmod(number, len(_ALPHABET))
+        code.append(_ALPHABET[remainder])
+    return "".join(code)
+
+def _short_url(code):
+    return f"{SHORTLINK_BASE_URL.rstrip('/')}/s/{code}"
+
+def shorten_url(long_url):
+    """
+    Devolve a URL curta provável para 'long_url' (calculada localmente) ou None se
+    não configurado. A definitiva é a devolvida por register(), que só difere
+    desta se o código já pertencer a outra URL.
+    """
+    if not SHORTLINK_BASE_URL:
+        return None
+    return _short_url(make_code(long_url))
+
+def get_table_client(connection_string=None):
+    """Cliente da tabela de links, criando-a na primeira utilização do processo."""
+    global _table_ready
+    if not _table_ready:
+        clients.get_table_service_client(connection_string).create_table_if_not_exists(table_name=SHORTLINKS_TABLE)
+        _table_ready = True
+    return clients.get_table_client(SHORTLINKS_TABLE, connection_string)
+
+def register(long_url, table_client=None):
+    """
+    Grava o mapeamento código -> URL e devolve a URL curta registada (None se não
+    configurado ou em caso de falha, que nunca faz falhar o job). O código é criado
+    com create_entity: se já existir para outra URL, tenta-se o código seguinte,
+    mais longo, em vez de sobrescrever o link de outra pessoa.
+    """
+    if not SHORTLINK_BASE_URL:
+        return None
+    try:
+        table_client = table_client or get_table_client()
+        for length in range(CODE_LENGTH, MAX_CODE_LENGTH + 1):
+            code = make_code(long_url, length)
+            try:
+                table_client.create_entity(entity={'PartitionKey': SHORTLINKS_PARTITION, 'RowKey': code, 'url': long_url})
+                return _short_url(code)
+            except ResourceExistsError:
+                existing = table_client.get_entity(partition_key=SHORTLINKS_PARTITION, row_key=code)
+                if existing.get('url') == long_url:
+                    return _short_url(code)
+                logging.warning(f"LINKS: Colisão no código '{code}'; a tentar um código mais longo.")
+        logging.warning(f"LINKS: Nenhum código livre para {long_url}.")
+    except Exception as e:
+        logging.warning(f"LINKS: Não foi possível registar o link curto para {long_url}: {e}")
+    return None
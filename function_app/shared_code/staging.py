@@ -0,0 +1,119 @@
+# Ficheiro: function_app/shared_code/staging.py
+# Preparação da entrada de cada job. O blob é copiado uma única vez, em blocos,
+# para um StagedInput: fica em memória enquanto é pequeno e passa para um
+# ficheiro temporário acima de STAGING_MAX_MEMORY. Os processadores recebem um
+# stream seekable e, se precisarem de um caminho (ffmpeg, MuPDF), pedem-no com
+# local_file(), que reutiliza esse ficheiro em vez de fazer outra cópia. A
+# memória por job fica limitada ao limiar, qualquer que seja o tamanho da entrada.
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+# Entradas até este tamanho ficam em memória; acima disso vão para disco.
+STAGING_MAX_MEMORY = int(os.environ.get("STAGING_MAX_MEMORY_MB", 32)) * 1024 * 1024
+READ_CHUNK_SIZE = 4 * 1024 * 1024
+
+class StagedInput(io.RawIOBase):
+    """
+    Cópia local da entrada, seekable. Calcula o SHA-256 à medida que é escrita
+    (usado pela cache de resultados). O ficheiro em disco, se existir, é
+    apagado no close().
+    """
+
+    def __init__(self, suffix='', max_memory=STAGING_MAX_MEMORY):
+        super().__init__()
+        self.suffix = suffix
+        self.max_memory = max_memory
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._sha256 = hashlib.sha256()
+
+    @property
+    def _target(self):
+        return self._file if self._file is not None else self._buffer
+
+    @property
+    def on_disk(self):
+        return self._file is not None
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, data):
+        if self._file is None and self._buffer.tell() + len(data) > self.max_memory:
+            self._spill()
+        self._sha256.update(data)
+        return self._target.write(data)
+
+    def readinto(self, buffer):
+        return self._target.readinto(buffer)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._target.seek(offset, whence)
+
+    def tell(self):
+        return self._target.tell()
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+    def _spill(self):
+        """Passa o conteúdo em memória para um ficheiro temporário (mantém a posição)."""
+        position = self._buffer.tell()
+        self._file = tempfile.NamedTemporaryFile(prefix="staged_", suffix=self.suffix, delete=False)
+        self._file.write(self._buffer.getbuffer())
+        self._file.seek(position)
+        self._buffer = None
+
+    def path(self):
+        """Caminho de um ficheiro com o conteúdo (se ainda estiver em memória, é escrito agora)."""
+        if self._file is None:
+            self._spill()
+        self._file.flush()
+        return self._file.name
+
+    def close(self):
+        if self._file is not None and not self.closed:
+            self._file.close()
+            if os.path.exists(self._file.name):
+                os.remove(self._file.name)
+        super().close()
+
+def stage_stream(stream, name=''):
+    """Copia um stream já aberto (p. ex. num servidor local) para um StagedInput, em blocos."""
+    staged = StagedInput(suffix=os.path.splitext(name)[1])
+    shutil.copyfileobj(stream, staged, READ_CHUNK_SIZE)
+    staged.seek(0)
+    return staged
+
+def stage_blob(blob_client, name=''):
+    """
+    Descarrega um blob para um StagedInput (o caminho da Function App, acionada só
+    com o nome do blob). O readinto do SDK escreve-o bloco a bloco
+    (max_chunk_get_size, 4 MiB por omissão), sem o ter inteiro em memória.
+    """
+    staged = StagedInput(suffix=os.path.splitext(name or blob_client.blob_name)[1])
+    blob_client.download_blob(max_concurrency=1).readinto(staged)
+    staged.seek(0)
+    return staged
+
+def local_file(stream, suffix=''):
+    """
+    Caminho local para ferramentas que leem ficheiros (ffmpeg, MuPDF). Retorna
+    (caminho, temporário): com um StagedInput é o seu próprio ficheiro e quem o
+    apaga é o close() dele; com outro stream é feita uma cópia que o chamador apaga.
+    """
+    if isinstance(stream, StagedInput):
+        return stream.path(), False
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        shutil.copyfileobj(stream, temp_file, READ_CHUNK_SIZE)
+        return temp_file.name, True
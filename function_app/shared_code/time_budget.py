@@ -0,0 +1,26 @@
+# Ficheiro: function_app/shared_code/time_budget.py
+# Orçamento de tempo da invocação atual. O gestor marca o início de cada job e
+# os processadores perguntam quanto tempo resta antes do timeout do Functions,
+# para escolherem definições mais rápidas quando o trabalho não caberia.
+
+import contextvars
+import os
+import time
+
+# functionTimeout do host (5 minutos por omissão no plano de consumo).
+FUNCTION_TIMEOUT_SECONDS = int(os.environ.get("FUNCTION_TIMEOUT_SECONDS", 300))
+# Reservado para o upload do resultado e a atualização da linha do job.
+SAFETY_MARGIN_SECONDS = 30
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+def start(timeout_seconds=FUNCTION_TIMEOUT_SECONDS):
+    """Marca o início do job na invocação (thread) atual."""
+    _deadline.set(time.monotonic() + timeout_seconds)
+
+def remaining():
+    """Segundos que ainda podem ser gastos em processamento, ou None fora de uma invocação."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic() - SAFETY_MARGIN_SECONDS)
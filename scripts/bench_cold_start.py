@@ -0,0 +1,49 @@
+# Ficheiro: scripts/bench_cold_start.py
+# Mede o custo de import (cold start) de cada processador da Function App.
+# Cada medição corre num interpretador novo, tal como num cold start real.
+#
+# Uso: python scripts/bench_cold_start.py [repetições]
+
+import os
+import statistics
+import subprocess
+import sys
+
+FUNCTION_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "function_app")
+
+# Importa o módulo e imprime apenas o tempo gasto no import, em segundos.
+_MEASURE = (
+    "import importlib, time; t = time.perf_counter(); "
+    "importlib.import_module({module!r}); print(time.perf_counter() - t)"
+)
+
+def measure_import(module, repeats):
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", _MEASURE.format(module=module)],
+            cwd=FUNCTION_APP_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(float(output.strip()) * 1000)
+    return samples
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    sys.path.insert(0, FUNCTION_APP_DIR)
+    from shared_code.operations import OPERATIONS, PROCESSOR_MODULES
+
+    modules = [("ponto de entrada", "shared_code.main_handler")]
+    modules += [(name, f"shared_code.processors.{name}") for name in PROCESSOR_MODULES]
+
+    print(f"{'módulo':<20} {'mediana (ms)':>14} {'mín (ms)':>10} {'máx (ms)':>10}  operações")
+    for label, module in modules:
+        try:
+            samples = measure_import(module, repeats)
+        except subprocess.CalledProcessError as e:
+            print(f"{label:<20} falhou: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        operations = ", ".join(op for op, name in OPERATIONS.items() if name == label)
+        print(f"{label:<20} {statistics.median(samples):>14.1f} {min(samples):>10.1f} {max(samples):>10.1f}  {operations}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Ficheiro: scripts/bench_image_ops.py
+# Micro-benchmark das operações de imagem da Function App sobre um corpus
+# sintético fixo (1 MP, 12 MP e 48 MP). Para cada operação e tamanho reporta
+# ms/imagem (descodificar + processar + codificar) e o pico de RSS. O corpus é
+# gerado uma vez, no processo principal, e gravado em ficheiros; cada medição
+# corre num processo novo que só lê os bytes do JPEG, para que o pico de memória
+# seja o dessa operação. 'acima da base' desconta o RSS do processo já com os
+# módulos importados e o JPEG lido, antes da primeira execução.
+#
+# Uso: python scripts/bench_image_ops.py [repetições] [tamanhos, ex.: 1,12]
+
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+FUNCTION_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "function_app")
+
+# Resoluções 4:3 com o número de megapixels indicado.
+CORPUS = {1: (1152, 864), 12: (4000, 3000), 48: (8000, 6000)}
+
+OPERATIONS = [
+    ("img_to_bw", None),
+    ("img_to_sepia", None),
+    ("img_pipeline", json.dumps({"steps": [
+        {"op": "resize", "width": 1920}, {"op": "contrast", "factor": 1.1}, {"op": "sepia"}
+    ], "format": "JPEG", "quality": 85})),
+    # Implementação anterior do sépia (grayscale + colorize), para comparação.
+    ("legacy_sepia", None),
+]
+
+def _synthetic_jpeg(size, path):
+    """Grava em 'path' uma imagem determinística com gradientes e ruído (conteúdo realista para o codec)."""
+    from PIL import Image
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    img.save(path, format="JPEG", quality=90)
+
+def _run_once(operation, params, data):
+    from PIL import Image, ImageOps
+    from shared_code.processors import image_processor
+
+    if operation == "legacy_sepia":
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        output = io.BytesIO()
+        ImageOps.colorize(ImageOps.grayscale(img), "#704214", "#C0A080").save(output, format="JPEG")
+        return
+    image_processor.handle(operation, io.BytesIO(data), None, "bench.jpg", "bench", params)
+
+def _rss_mib():
+    # ru_maxrss vem em KiB no Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _measure(operation, params, corpus_path, repeats, results):
+    sys.path.insert(0, FUNCTION_APP_DIR)
+    from shared_code.processors import image_processor
+
+    # Sem upload: mede-se só o trabalho local (descodificar, processar, codificar).
+    image_processor.upload_and_get_urls = lambda *args: {"outputUrl": "bench"}
+
+    with open(corpus_path, "rb") as f:
+        data = f.read()
+    baseline = _rss_mib()
+    _run_once(operation, params, data)  # aquecimento (imports, caches do Pillow)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _run_once(operation, params, data)
+        timings.append((time.perf_counter() - start) * 1000)
+    peak = _rss_mib()
+    results.put((statistics.median(timings), peak, peak - baseline))
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sizes = [int(mp) for mp in sys.argv[2].split(",")] if len(sys.argv) > 2 else sorted(CORPUS)
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        corpus = {}
+        for mp in sizes:
+            corpus[mp] = os.path.join(corpus_dir, f"corpus_{mp}mp.jpg")
+            _synthetic_jpeg(CORPUS[mp], corpus[mp])
+
+        print(f"{'operação':<16} {'MP':>4} {'ms/imagem':>12} {'pico RSS (MiB)':>16} {'acima da base':>14}")
+        for operation, params in OPERATIONS:
+            for mp in sizes:
+                results = context.Queue()
+                process = context.Process(target=_measure, args=(operation, params, corpus[mp], repeats, results))
+                process.start()
+                process.join()
+                if process.exitcode != 0:
+                    print(f"{operation:<16} {mp:>4} {'falhou':>12}")
+                    continue
+                median_ms, peak_rss, above_baseline = results.get()
+                print(f"{operation:<16} {mp:>4} {median_ms:>12.1f} {peak_rss:>16.1f} {above_baseline:>14.1f}")
+
+if __name__ == "__main__":
+    main()
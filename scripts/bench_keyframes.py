@@ -0,0 +1,71 @@
+# Ficheiro: scripts/bench_keyframes.py
+# Compara a extração de keyframes antiga (cap.read() em todos os frames, escrita
+# síncrona) com o motor atual de backend/shared/processors/video_processor.py,
+# nos modos 'interval' e 'scene', sobre um vídeo sintético 1080p (1 hora por
+# omissão; gerá-lo demora alguns minutos e o ficheiro é reutilizado).
+#
+# Uso: python scripts/bench_keyframes.py [duração em s] [intervalo em s]
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+def _synthetic_video(path, duration):
+    """1080p a 30 fps em H.264, keyframe a cada 2 s, com um padrão diferente a cada minuto."""
+    import imageio_ffmpeg
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=duration={duration}:size=1920x1080:rate=30,hue=H=2*PI*floor(t/60)/7",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60', '-pix_fmt', 'yuv420p', path
+    ], check=True)
+
+def _legacy_extract(input_path, output_dir, interval):
+    """A implementação anterior, para comparação."""
+    import cv2
+    cap = cv2.VideoCapture(input_path)
+    frame_interval = int(cap.get(cv2.CAP_PROP_FPS) * interval)
+    count = frame_count = 0
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if count % frame_interval == 0:
+            cv2.imwrite(os.path.join(output_dir, f"frame_{frame_count:04d}.jpg"), frame)
+            frame_count += 1
+        count += 1
+    cap.release()
+    return frame_count
+
+def main():
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 3600
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sys.path.insert(0, BACKEND_DIR)
+    from shared.processors import video_processor
+
+    source = os.path.join(tempfile.gettempdir(), f"bench_keyframes_{duration}s_1080p.mp4")
+    if not os.path.exists(source):
+        print(f"A gerar {source} ...")
+        _synthetic_video(source, duration)
+
+    runs = [
+        ("anterior (read)", lambda out: _legacy_extract(source, out, interval)),
+        ("interval", lambda out: len(video_processor.extract_keyframes(source, out, interval=interval))),
+        ("scene", lambda out: len(video_processor.extract_keyframes(source, out, mode='scene'))),
+    ]
+    print(f"{duration} s de vídeo 1080p, intervalo {interval} s")
+    print(f"{'modo':<18} {'frames':>7} {'tempo (s)':>10} {'aceleração':>11}")
+    baseline = None
+    for label, run in runs:
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            count = run(output_dir)
+            elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{label:<18} {count:>7} {elapsed:>10.1f} {baseline / elapsed:>10.2f}x")
+
+if __name__ == "__main__":
+    main()
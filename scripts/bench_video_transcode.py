@@ -0,0 +1,77 @@
+# Ficheiro: scripts/bench_video_transcode.py
+# Compara o tempo de parede do video_to_mp4 no caminho normal (um só ffmpeg)
+# com a codificação paralela por segmentos para 2, 4 e 8 workers, sobre um vídeo
+# sintético 1080p em MPEG-4 Part 2 (que obriga a recodificar o vídeo). Confere
+# também que cada saída paralela tem os mesmos frames e a mesma duração que a
+# do caminho normal.
+#
+# Uso: python scripts/bench_video_transcode.py [duração em s] [perfil]
+
+import io
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+FUNCTION_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "function_app")
+WORKERS = (1, 2, 4, 8)
+
+def _synthetic_video(path, duration):
+    """1080p a 30 fps com áudio, keyframe a cada 2 s (como uma câmara ou um telemóvel)."""
+    import imageio_ffmpeg
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=duration={duration}:size=1920x1080:rate=30",
+        '-f', 'lavfi', '-i', f"sine=duration={duration}",
+        '-c:v', 'mpeg4', '-q:v', '4', '-g', '60', '-c:a', 'libmp3lame', path
+    ], check=True)
+
+def _frame_count(path):
+    """Frames de vídeo do ficheiro, tal como estão (sem duplicar nem descartar)."""
+    import imageio_ffmpeg
+    result = subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), '-hide_banner', '-i', path, '-map', '0:v:0',
+        '-fps_mode', 'passthrough', '-f', 'null', '-'
+    ], capture_output=True, text=True, check=True)
+    return int(re.findall(r"frame=\s*(\d+)", result.stderr)[-1])
+
+def main():
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    profile = sys.argv[2] if len(sys.argv) > 2 else 'balanced'
+    sys.path.insert(0, FUNCTION_APP_DIR)
+    from shared_code.processors import media, video_processor
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Sem upload: mede-se só a conversão, e a saída fica para ser conferida.
+        output = os.path.join(temp_dir, "saida.mp4")
+        def keep_output(data, *args):
+            with open(output, "wb") as f:
+                shutil.copyfileobj(data, f)
+            return {"outputUrl": "bench"}
+        video_processor.upload_and_get_urls = keep_output
+
+        source = os.path.join(temp_dir, "origem.avi")
+        _synthetic_video(source, duration)
+        with open(source, "rb") as f:
+            data = f.read()
+
+        print(f"{duration} s de vídeo 1080p, perfil '{profile}', {media.AVAILABLE_CORES} núcleos")
+        print(f"{'workers':>8} {'segmentos':>10} {'tempo (s)':>10} {'aceleração':>11} {'frames':>7} {'duração (s)':>12}")
+        baseline = serial = None
+        for workers in WORKERS:
+            params = {'profile': profile, 'workers': workers}
+            start = time.perf_counter()
+            result = video_processor.convert_to_mp4(io.BytesIO(data), None, "origem.avi", "bench", params)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            segments = result['stats'].get('segments', 1)
+            checked = (_frame_count(output), media.probe(output)['duration'])
+            serial = serial or checked
+            mismatch = "" if checked == serial else f"  <- difere do caminho normal {serial}"
+            print(f"{workers:>8} {segments:>10} {elapsed:>10.1f} {baseline / elapsed:>10.2f}x {checked[0]:>7} {checked[1]:>12.2f}{mismatch}")
+
+if __name__ == "__main__":
+    main()
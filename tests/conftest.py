@@ -0,0 +1,11 @@
+# Ficheiro: tests/conftest.py
+# Os testes importam o frontend ('app') e a Function App ('shared_code') tal
+# como cada um corre em produção: a partir da sua própria pasta.
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
+sys.path.insert(0, os.path.join(ROOT, "function_app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,102 @@
+# Ficheiro: tests/fakes.py
+# Substitutos em memória do Table Storage e do Blob Storage para os testes.
+# O $filter é avaliado traduzindo a sintaxe OData usada pelo projeto para Python.
+
+import re
+import threading
+from datetime import datetime, timezone
+
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+_OPERATORS = {'eq': '==', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+_TOKEN = re.compile(r"@(\w+)|'([^']*)'|\b(eq|ne|lt|le|gt|ge|and|or|not)\b|\b([A-Za-z_]\w*)\b")
+
+def _compile_filter(query_filter, parameters):
+    def replace(match):
+        param, literal, operator, field = match.groups()
+        if param:
+            return f"_p[{param!r}]"
+        if literal is not None:
+            return repr(literal)
+        if operator:
+            return _OPERATORS.get(operator, operator)
+        return f"_e.get({field!r})"
+    expression = _TOKEN.sub(replace, query_filter)
+    return lambda entity: eval(expression, {}, {'_e': entity, '_p': parameters or {}})
+
+class FakeTableClient:
+    def __init__(self):
+        self.rows = {}
+        self._lock = threading.Lock()
+
+    def _key(self, entity):
+        return entity['PartitionKey'], entity['RowKey']
+
+    def _stamp(self, entity):
+        entity = dict(entity)
+        entity['Timestamp'] = datetime.now(timezone.utc)
+        return entity
+
+    def create_entity(self, entity):
+        with self._lock:
+            if self._key(entity) in self.rows:
+                raise ResourceExistsError("EntityAlreadyExists")
+            self.rows[self._key(entity)] = self._stamp(entity)
+
+    def upsert_entity(self, entity, mode=None):
+        with self._lock:
+            current = self.rows.get(self._key(entity), {})
+            self.rows[self._key(entity)] = self._stamp({**current, **entity})
+
+    def update_entity(self, entity, mode=None):
+        with self._lock:
+            if self._key(entity) not in self.rows:
+                raise ResourceNotFoundError("ResourceNotFound")
+            self.rows[self._key(entity)] = self._stamp({**self.rows[self._key(entity)], **entity})
+
+    def get_entity(self, partition_key, row_key):
+        with self._lock:
+            if (partition_key, row_key) not in self.rows:
+                raise ResourceNotFoundError("ResourceNotFound")
+            return dict(self.rows[(partition_key, row_key)])
+
+    def delete_entity(self, partition_key, row_key):
+        with self._lock:
+            self.rows.pop((partition_key, row_key), None)
+
+    def query_entities(self, query_filter, parameters=None, select=None):
+        matches = _compile_filter(query_filter, parameters)
+        with self._lock:
+            rows = [dict(row) for row in self.rows.values()]
+        return [row for row in rows if matches(row)]
+
+class FakeBlobClient:
+    def __init__(self, service, container, name):
+        self.service, self.container, self.blob_name = service, container, name
+        self.url = f"https://account.blob.core.windows.net/{container}/{name}"
+
+    def exists(self):
+        return (self.container, self.blob_name) in self.service.blobs
+
+    def upload_blob(self, data, overwrite=False, metadata=None, **kwargs):
+        content = data if isinstance(data, bytes) else data.read()
+        self.service.blobs[(self.container, self.blob_name)] = content
+        self.service.metadata[(self.container, self.blob_name)] = metadata or {}
+
+    def download_blob(self, max_concurrency=1):
+        data = self.service.blobs[(self.container, self.blob_name)]
+        return type("Downloader", (), {"readinto": lambda _, stream: stream.write(data)})()
+
+    def delete_blob(self):
+        self.service.blobs.pop((self.container, self.blob_name), None)
+
+class FakeBlobServiceClient:
+    account_name = "account"
+
+    def __init__(self, account_key="a2V5"):
+        self.blobs = {}
+        self.metadata = {}
+        self.credential = type("Credential", (), {"account_key": account_key})()
+
+    def get_blob_client(self, container, blob):
+        return FakeBlobClient(self, container, blob)
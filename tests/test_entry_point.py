@@ -0,0 +1,27 @@
+# Ficheiro: tests/test_entry_point.py
+# A Function App é acionada só com o nome do blob: o gestor descarrega a entrada
+# em blocos para a cópia local do job, sem receber o conteúdo do gatilho.
+import pytest
+
+from shared_code import main_handler, staging
+from fakes import FakeBlobServiceClient, FakeTableClient
+
+def test_process_event_downloads_the_input_without_a_stream(monkeypatch):
+    blobs = FakeBlobServiceClient()
+    blobs.blobs[(main_handler.INPUT_CONTAINER, "job.png")] = b'conteudo'
+    received = []
+    def fake_route(operation, blob_stream, blob_service_client, blob_name, params, progress=None):
+        received.append((isinstance(blob_stream, staging.StagedInput), blob_stream.read()))
+        return {'outputUrl': 'https://account/out/job_bw.png'}
+    monkeypatch.setattr(main_handler, '_route', fake_route)
+
+    main_handler.process_event("job.png", None, {'operation': 'img_to_bw'}, blobs, FakeTableClient())
+
+    assert received == [(True, b'conteudo')]
+
+def test_event_subject_to_input_blob_name():
+    pytest.importorskip("azure.functions")
+    from ProcessUploadedFile import input_blob_name
+
+    assert input_blob_name("/blobServices/default/containers/input-files/blobs/job.png") == "job.png"
+    assert input_blob_name("/blobServices/default/containers/output-files/blobs/job.png") is None
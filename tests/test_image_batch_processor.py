@@ -0,0 +1,7 @@
+# Ficheiro: tests/test_image_batch_processor.py
+from shared_code.processors.image_batch_processor import _output_name
+
+def test_output_names_do_not_collide():
+    used = set()
+    names = [_output_name(n, '_bw.png', used) for n in ('a.jpg', 'a.png', 'a.PNG', 'b.jpg')]
+    assert names == ['a_bw.png', 'a_png_bw.png', 'a_png_2_bw.png', 'b_bw.png']
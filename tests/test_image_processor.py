@@ -0,0 +1,22 @@
+# Ficheiro: tests/test_image_processor.py
+import pytest
+
+from shared_code.processors.image_processor import _apply_geometry, _optional_params, _target_size
+
+@pytest.mark.parametrize("step, expected", [
+    ({'op': 'resize', 'width': 2000}, (2000, 1000)),
+    ({'op': 'resize', 'height': 250}, (500, 250)),
+    ({'op': 'resize', 'width': 10, 'height': 20}, (10, 20)),
+    ({'op': 'thumbnail', 'width': 2000}, (1000, 500)),
+    ({'op': 'thumbnail', 'width': 500, 'height': 500}, (500, 250)),
+])
+def test_target_size(step, expected):
+    assert _target_size(step, (1000, 500)) == expected
+
+def test_crop_without_box_is_a_value_error():
+    with pytest.raises(ValueError):
+        _apply_geometry(None, {'op': 'crop'})
+
+def test_bw_and_sepia_ignore_non_json_params():
+    assert _optional_params('not json') == {}
+    assert _optional_params('{"compress_level": 1}') == {'compress_level': 1}
@@ -0,0 +1,46 @@
+# Ficheiro: tests/test_job_roundtrip.py
+# O frontend cria a linha do job e a Function App atualiza-a: os dois têm de
+# usar a mesma partição para que o estado, o progresso e as métricas cheguem a /status.
+import io
+
+from app import create_app, routes
+from shared_code import main_handler
+from fakes import FakeBlobServiceClient, FakeTableClient
+
+def test_same_jobs_partition():
+    assert main_handler.JOBS_PARTITION == routes.JOBS_PARTITION
+
+def test_function_updates_reach_status(monkeypatch):
+    app = create_app()
+    app.jobs_table_client = FakeTableClient()
+    app.blob_service_client = FakeBlobServiceClient()
+    client = app.test_client()
+
+    job_id = client.post('/upload', data={'file': (io.BytesIO(b'%PDF'), 'doc.pdf'), 'operation': 'pdf_to_images'}).get_json()['job_id']
+
+    def fake_route(operation, blob_stream, blob_service_client, blob_name, params, progress=None):
+        progress(pagesDone=2, pagesTotal=2, renderStage='encode', renderPercent=100)
+        return {'outputUrl': 'https://account.blob.core.windows.net/output-files/doc_images.zip', 'stats': {'pages': 2}}
+
+    monkeypatch.setattr(main_handler, '_route', fake_route)
+    main_handler.process_event(f"{job_id}.pdf", io.BytesIO(b'%PDF'), {'operation': 'pdf_to_images'},
+                               app.blob_service_client, app.jobs_table_client)
+
+    assert len(app.jobs_table_client.rows) == 1
+    payload = client.get(f'/status/{job_id}').get_json()
+    assert payload['status'] == 'completed'
+    assert payload['result_url'].endswith('doc_images.zip')
+    assert payload['pages'] == {'done': 2, 'total': 2}
+    assert payload['progress'] == {'stage': 'encode', 'percent': 100}
+    assert payload['stats'] == {'pages': 2}
+
+def test_batch_status_reads_function_results():
+    app = create_app()
+    app.jobs_table_client = FakeTableClient()
+    app.jobs_table_client.create_entity({'PartitionKey': main_handler.JOBS_PARTITION, 'RowKey': 'lote-0',
+                                         'status': 'completed', 'outputUrl': 'https://example/out.png'})
+    app.jobs_table_client.create_entity({'PartitionKey': main_handler.JOBS_PARTITION, 'RowKey': 'lote-1',
+                                         'status': 'failed', 'errorMessage': 'falhou'})
+    body = app.test_client().get('/batches/lote').get_json()
+    assert body['jobs'] == {'lote-0': {'status': 'completed', 'result_url': 'https://example/out.png'},
+                            'lote-1': {'status': 'failed', 'error_message': 'falhou'}}
@@ -0,0 +1,17 @@
+# Ficheiro: tests/test_media.py
+from shared_code.processors import media
+
+def test_default_conversion_keeps_resolution():
+    args = media.video_encoder_args('balanced', 3840, 2160, capped=False)
+    assert '-vf' not in args and '-threads' not in args
+
+def test_requested_profile_caps_height():
+    args = media.video_encoder_args('balanced', 3840, 2160, threads=2)
+    assert args[args.index('-vf') + 1] == 'scale=-2:1080'
+    assert args[args.index('-threads') + 1] == '2'
+    assert media.output_size('balanced', 3840, 2160) == (1920, 1080)
+    assert media.output_size('balanced', 3840, 2160, capped=False) == (3840, 2160)
+
+def test_frame_rate_restores_ntsc_rates():
+    assert [media.frame_rate(fps) for fps in (30.0, 29.97, 23.98, 59.94, 25.0, 12.5)] == \
+        ['30', '30000/1001', '24000/1001', '60000/1001', '25', '12.5']
@@ -0,0 +1,23 @@
+# Ficheiro: tests/test_pdf_processor.py
+import io
+
+import fitz
+from PIL import Image
+
+from shared_code.processors.pdf_processor import _image_display_sizes
+
+def _png(color):
+    output = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(output, format='PNG')
+    return output.getvalue()
+
+def test_masked_images_are_not_recompressed():
+    document = fitz.open()
+    page = document.new_page()
+    xrefs = [page.insert_image(fitz.Rect(0, 100 * i, 100, 100 * (i + 1)), stream=_png(color))
+             for i, color in enumerate(('red', 'green', 'blue'))]
+    plain, stencil, color_keyed = xrefs
+    document.xref_set_key(stencil, "ImageMask", "true")
+    document.xref_set_key(color_keyed, "Mask", "[0 10 0 10 0 10]")
+
+    assert list(_image_display_sizes(document)) == [plain]
@@ -0,0 +1,107 @@
+# Ficheiro: tests/test_result_cache.py
+import io
+
+import pytest
+
+from shared_code import result_cache, staging
+from fakes import FakeBlobServiceClient, FakeTableClient
+
+OUTPUT_URL = "https://account.blob.core.windows.net/output-files/job_bw.png"
+
+class _StoredBlob:
+    """BlobClient.from_blob_url mínimo: só o que store() lê da saída."""
+
+    def __init__(self, url, size):
+        self.container_name, self.blob_name = url.split('/')[-2:]
+        self._size = size
+
+    def get_blob_properties(self):
+        return type("Properties", (), {"size": self._size})()
+
+@pytest.fixture(autouse=True)
+def blob_client(monkeypatch):
+    monkeypatch.setattr(result_cache.BlobClient, 'from_blob_url',
+                        staticmethod(lambda url, **kwargs: _StoredBlob(url, 10)))
+
+def _run(table, blobs, data=b'entrada', params='{}', stats=None):
+    calls = []
+    def process(stream):
+        calls.append(stream.read())
+        blobs.blobs[("output-files", "job_bw.png")] = b'saida'
+        return {'outputUrl': OUTPUT_URL, 'stats': stats or {}}
+    result, hit = result_cache.run_cached(table, blobs, staging.stage_stream(io.BytesIO(data)), 'img_to_bw', params, process)
+    return result, hit, calls
+
+def test_identical_job_is_a_cache_hit():
+    table, blobs = FakeTableClient(), FakeBlobServiceClient()
+    first, first_hit, first_calls = _run(table, blobs)
+    second, second_hit, second_calls = _run(table, blobs)
+
+    assert (first_hit, first_calls) == (False, [b'entrada'])
+    assert (second_hit, second_calls) == (True, [])
+    assert second['outputUrl'] == OUTPUT_URL
+
+def test_other_params_are_a_miss():
+    table, blobs = FakeTableClient(), FakeBlobServiceClient()
+    _run(table, blobs)
+    _, hit, calls = _run(table, blobs, params='{"compress_level": 1}')
+    assert not hit and calls
+
+def test_downgraded_result_is_not_cached():
+    table, blobs = FakeTableClient(), FakeBlobServiceClient()
+    _run(table, blobs, stats={'profile': 'fast-preview', 'profileRequested': 'balanced'})
+    assert not table.rows
+
+    _, hit, calls = _run(table, blobs, stats={'profile': 'balanced'})
+    assert not hit and calls
+    assert len(table.rows) == 1
+
+def test_stale_entry_is_deleted_and_the_job_reprocessed():
+    table, blobs = FakeTableClient(), FakeBlobServiceClient()
+    _run(table, blobs)
+    del blobs.blobs[("output-files", "job_bw.png")]
+    key = next(iter(table.rows))
+
+    real_delete = table.delete_entity
+    deleted = []
+    table.delete_entity = lambda partition_key, row_key: (deleted.append(row_key), real_delete(partition_key, row_key))
+    _, hit, calls = _run(table, blobs)
+
+    assert deleted == [key[1]]
+    assert not hit and calls == [b'entrada']
+    assert key in table.rows  # reindexado com a nova saída
+
+def test_evict_removes_least_recently_used_until_it_fits():
+    table = FakeTableClient()
+    for key, size, last_used in (('a', 40, '2026-01-03'), ('b', 40, '2026-01-01'), ('c', 40, '2026-01-02')):
+        table.create_entity({'PartitionKey': result_cache.RESULT_CACHE_PARTITION, 'RowKey': key,
+                             'size': size, 'lastUsed': last_used})
+
+    assert result_cache.evict(table, max_bytes=50) == 2
+    assert [row_key for _, row_key in table.rows] == ['a']
+    assert result_cache.evict(table, max_bytes=50) == 0
+
+def test_cache_hit_is_recorded_on_the_job(monkeypatch):
+    from shared_code import main_handler
+    jobs, cache, blobs = FakeTableClient(), FakeTableClient(), FakeBlobServiceClient()
+    routed = []
+    def fake_route(operation, blob_stream, blob_service_client, blob_name, params, progress=None):
+        routed.append(blob_name)
+        blobs.blobs[("output-files", "job_bw.png")] = b'saida'
+        return {'outputUrl': OUTPUT_URL}
+    monkeypatch.setattr(main_handler, '_route', fake_route)
+
+    for job_id in ('job-1', 'job-2'):
+        main_handler.process_event(f"{job_id}.png", io.BytesIO(b'entrada'), {'operation': 'img_to_bw'},
+                                   blobs, jobs, cache_table_client=cache)
+
+    assert routed == ['job-1.png']
+    job = jobs.get_entity(main_handler.JOBS_PARTITION, 'job-2')
+    assert (job['status'], job['outputUrl'], job.get('cacheHit')) == ('completed', OUTPUT_URL, True)
+
+def test_slideshow_with_skipped_transitions_is_not_cached():
+    table, blobs = FakeTableClient(), FakeBlobServiceClient()
+    _run(table, blobs, stats={'slides': 3, 'transitions': 0, 'transitionsSkipped': 2})
+    assert not table.rows
+    _run(table, blobs, stats={'slides': 3, 'transitions': 2, 'transitionsSkipped': 0})
+    assert len(table.rows) == 1
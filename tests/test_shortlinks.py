@@ -0,0 +1,68 @@
+# Ficheiro: tests/test_shortlinks.py
+import pytest
+
+from shared_code import shortlinks
+from fakes import FakeTableClient
+
+@pytest.fixture(autouse=True)
+def base_url(monkeypatch):
+    monkeypatch.setattr(shortlinks, 'SHORTLINK_BASE_URL', 'https://app.example')
+
+def test_register_is_idempotent():
+    table = FakeTableClient()
+    url = 'https://account/out/a.png'
+    assert shortlinks.register(url, table) == shortlinks.shorten_url(url)
+    assert shortlinks.register(url, table) == shortlinks.shorten_url(url)
+    assert len(table.rows) == 1
+
+def test_collision_uses_a_longer_code_instead_of_overwriting():
+    table = FakeTableClient()
+    url = 'https://account/out/b.png'
+    taken = shortlinks.make_code(url)
+    table.create_entity({'PartitionKey': shortlinks.SHORTLINKS_PARTITION, 'RowKey': taken, 'url': 'https://other'})
+
+    short_url = shortlinks.register(url, table)
+
+    assert short_url == f"https://app.example/s/{shortlinks.make_code(url, shortlinks.CODE_LENGTH + 1)}"
+    assert table.get_entity(shortlinks.SHORTLINKS_PARTITION, taken)['url'] == 'https://other'
+
+def _process(monkeypatch, links_table):
+    import io
+    from shared_code import main_handler
+    from fakes import FakeBlobServiceClient
+    monkeypatch.setattr(shortlinks, 'get_table_client', lambda: links_table)
+    monkeypatch.setattr(main_handler, '_route', lambda *args, **kwargs: {
+        'outputUrl': 'https://account/out/c.png', 'shortUrl': shortlinks.shorten_url('https://account/out/c.png')})
+    jobs = FakeTableClient()
+    links_at_completion = []
+    upsert = jobs.upsert_entity
+    def recording_upsert(entity, mode=None):
+        if entity.get('status') == 'completed':
+            links_at_completion.append(dict(getattr(links_table, 'rows', {})))
+        upsert(entity, mode)
+    jobs.upsert_entity = recording_upsert
+    main_handler.process_event("job-9.png", io.BytesIO(b'x'), {'operation': 'img_to_bw'}, FakeBlobServiceClient(), jobs)
+    return jobs.get_entity(main_handler.JOBS_PARTITION, 'job-9'), links_at_completion
+
+def test_short_link_is_registered_before_the_job_completes(monkeypatch):
+    table = FakeTableClient()
+    taken = shortlinks.make_code('https://account/out/c.png')
+    table.create_entity({'PartitionKey': shortlinks.SHORTLINKS_PARTITION, 'RowKey': taken, 'url': 'https://other'})
+
+    job, links_at_completion = _process(monkeypatch, table)
+
+    assert job['status'] == 'completed'
+    code = job['shortUrl'].rsplit('/', 1)[1]
+    assert code != taken
+    assert len(links_at_completion) == 1
+    assert links_at_completion[0][(shortlinks.SHORTLINKS_PARTITION, code)]['url'] == 'https://account/out/c.png'
+
+def test_failed_registration_publishes_no_short_url(monkeypatch):
+    class BrokenTable:
+        def create_entity(self, entity):
+            raise ConnectionError("tabela indisponível")
+
+    job, _ = _process(monkeypatch, BrokenTable())
+
+    assert job['status'] == 'completed'
+    assert 'shortUrl' not in job
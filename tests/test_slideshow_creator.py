@@ -0,0 +1,44 @@
+# Ficheiro: tests/test_slideshow_creator.py
+import pytest
+
+from shared_code.processors import slideshow_creator
+from shared_code.processors.slideshow_creator import TRANSITION_FPS, _concat_list, _RenderProgress, _timeline
+
+def test_timeline_keeps_each_slide_duration_including_its_transition():
+    transitions = {0: ['t0_0.jpg', 't0_1.jpg']}
+    entries = _timeline(['a.jpg', 'b.jpg'], 3.0, transitions)
+
+    assert [path for path, _ in entries] == ['a.jpg', 't0_0.jpg', 't0_1.jpg', 'b.jpg']
+    assert entries[0][1] == pytest.approx(3.0 - 2 / TRANSITION_FPS)
+    assert sum(duration for _, duration in entries) == pytest.approx(6.0)
+
+def test_concat_list_uses_millisecond_timebase_and_repeats_the_last_image():
+    text = _concat_list([('a.jpg', 2.5), ('b.jpg', 0.04)])
+
+    assert text.splitlines() == [
+        "ffconcat version 1.0",
+        "file 'a.jpg'", "option framerate 1000", "duration 2.500",
+        "file 'b.jpg'", "option framerate 1000", "duration 0.040",
+        "file 'b.jpg'", "option framerate 1000",
+    ]
+
+def test_render_progress_maps_stages_and_throttles(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(slideshow_creator.time, 'monotonic', lambda: now[0])
+    reports = []
+    render_progress = _RenderProgress(lambda **fields: reports.append(fields))
+
+    render_progress.report('stills', 0.5)
+    render_progress.report('stills', 0.75)   # menos de 1 s depois: ignorado
+    render_progress.report('stills', 1)      # o fim de uma fase é sempre publicado
+    now[0] += 2
+    render_progress.report('encoding', 0.5)
+
+    assert reports == [
+        {'renderStage': 'stills', 'renderPercent': 20},
+        {'renderStage': 'stills', 'renderPercent': 40},
+        {'renderStage': 'encoding', 'renderPercent': 80},
+    ]
+
+def test_render_progress_without_reporter_is_a_no_op():
+    _RenderProgress(None).report('encoding', 1)
@@ -0,0 +1,40 @@
+# Ficheiro: tests/test_status.py
+import threading
+
+import pytest
+
+from app import create_app, routes
+from fakes import FakeBlobServiceClient, FakeTableClient
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.jobs_table_client = FakeTableClient()
+    app.blob_service_client = FakeBlobServiceClient()
+    app.jobs_table_client.create_entity({'PartitionKey': routes.JOBS_PARTITION, 'RowKey': 'job-1', 'status': 'Pending'})
+    return app
+
+def _call_with_timeout(fn, timeout=5):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', fn()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "o pedido ficou bloqueado"
+    return result['value']
+
+def test_sse_then_bulk_status_does_not_deadlock(app):
+    client = app.test_client()
+
+    def open_stream():
+        # O gerador SSE usa o contexto do pedido: é lido na mesma thread.
+        response = client.get('/status/job-1/events', buffered=False)
+        first_event = next(response.response)
+        response.close()
+        return response.status_code, first_event
+
+    status_code, first_event = _call_with_timeout(open_stream)
+    assert status_code == 200
+    assert b'"status": "Pending"' in first_event
+
+    bulk = _call_with_timeout(lambda: client.get('/status?ids=job-1,job-2'))
+    assert bulk.get_json()['jobs'] == {'job-1': {'status': 'Pending'}, 'job-2': {'status': 'Not Found'}}
@@ -0,0 +1,37 @@
+# Ficheiro: tests/test_uploads.py
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+
+import pytest
+
+from app import create_app, routes
+from fakes import FakeBlobServiceClient, FakeTableClient
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.jobs_table_client = FakeTableClient()
+    app.blob_service_client = FakeBlobServiceClient()
+    return app
+
+def test_sas_metadata_headers_are_ascii(app):
+    response = app.test_client().post('/uploads/sas', json={'filename': 'relatório ção.pdf', 'operation': 'pdf_to_images'})
+    assert response.status_code == 200
+    headers = response.get_json()['headers']
+    for value in headers.values():
+        value.encode('ascii')
+    assert unquote(headers['x-ms-meta-original_filename']) == 'relatório ção.pdf'
+
+def test_abandoned_direct_upload_is_marked_failed(app):
+    client = app.test_client()
+    job_id = client.post('/uploads/sas', json={'filename': 'a.png', 'operation': 'img_to_bw'}).get_json()['job_id']
+    uploaded_id = client.post('/uploads/sas', json={'filename': 'b.png', 'operation': 'img_to_bw'}).get_json()['job_id']
+    table = app.jobs_table_client
+    for row in table.rows.values():
+        row['upload_expires_at'] = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+    app.blob_service_client.get_blob_client(routes.INPUT_CONTAINER, f"{uploaded_id}.png").upload_blob(b'png')
+
+    routes._fail_abandoned_uploads(table, app.blob_service_client)
+
+    assert table.get_entity(routes.JOBS_PARTITION, job_id)['status'] == 'Failed'
+    assert table.get_entity(routes.JOBS_PARTITION, uploaded_id)['status'] == 'Pending'
@@ -0,0 +1,55 @@
+# Ficheiro: tests/test_video_processor.py
+import io
+import subprocess
+
+import pytest
+
+from shared_code import main_handler, result_cache, staging
+from shared_code.processors import media, video_processor
+from fakes import FakeBlobServiceClient, FakeTableClient
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "video.mp4"
+    subprocess.run([media.ffmpeg_exe(), '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=3:size=160x90:rate=10',
+                    '-c:v', 'mpeg4', str(path)], check=True)
+    return path
+
+def _fail(*args, **kwargs):
+    raise AssertionError("a entrada do thumbnail não deve ser copiada nem lida por inteiro")
+
+def test_thumbnail_is_not_staged_or_hashed(monkeypatch):
+    monkeypatch.setattr(staging, 'stage_stream', _fail)
+    monkeypatch.setattr(staging, 'stage_blob', _fail)
+    monkeypatch.setattr(result_cache, 'run_cached', _fail)
+    routed = []
+    def fake_route(operation, blob_stream, blob_service_client, blob_name, params, progress=None):
+        routed.append(blob_stream)
+        return {'outputUrl': 'https://account/out/thumb_job.jpg'}
+    monkeypatch.setattr(main_handler, '_route', fake_route)
+
+    jobs = FakeTableClient()
+    main_handler.process_event("job.mp4", None, {'operation': 'generate_thumbnail'},
+                               FakeBlobServiceClient(), jobs, cache_table_client=FakeTableClient())
+
+    assert routed == [None]
+    assert jobs.get_entity(main_handler.JOBS_PARTITION, 'job')['status'] == 'completed'
+
+def test_thumbnail_reads_the_blob_by_url(video, monkeypatch):
+    # O ffmpeg aceita um caminho onde aceitaria a URL com SAS.
+    monkeypatch.setattr(video_processor, 'read_url', lambda *args: str(video))
+    monkeypatch.setattr(staging, 'local_file', _fail)
+
+    blob_service_client = FakeBlobServiceClient()
+    video_processor.generate_thumbnail(None, blob_service_client, "job.mp4", "output-files")
+
+    assert blob_service_client.blobs[("output-files", "thumb_job.jpg")].startswith(b'\xff\xd8')
+
+def test_thumbnail_falls_back_to_the_received_stream(video, monkeypatch):
+    monkeypatch.setattr(video_processor, 'read_url', lambda *args: None)
+
+    blob_service_client = FakeBlobServiceClient()
+    with open(video, 'rb') as f:
+        video_processor.generate_thumbnail(io.BytesIO(f.read()), blob_service_client, "job.mp4", "output-files")
+
+    assert blob_service_client.blobs[("output-files", "thumb_job.jpg")].startswith(b'\xff\xd8')